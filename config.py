@@ -14,9 +14,22 @@ KATAGO_MODEL = os.environ.get("KATAGO_MODEL", "/usr/share/katago/models/kata1-b1
 # KataGo config file for analysis
 KATAGO_CONFIG = os.environ.get("KATAGO_CONFIG", "/etc/katago/analysis.cfg")
 
+# Seconds to wait for KataGo to report it is ready when starting it. Loading
+# can take minutes (OpenCL tuning, TensorRT plan builds, large models on
+# CPU); past this, queries just queue until the engine is ready.
+KATAGO_STARTUP_TIMEOUT = float(os.environ.get("KATAGO_STARTUP_TIMEOUT", "30"))
+
 # Directory where Sabaki saves SGF files
 SGF_WATCH_PATH = os.environ.get("SGF_WATCH_PATH", os.path.expanduser("~/go/games"))
 
+# Positions KataGo analyzes in parallel. Concurrent tool calls and
+# analyze_game's positions share one KataGo process, so this sets how many
+# of them are searched at the same time. Unset by default, leaving
+# numAnalysisThreads in KATAGO_CONFIG in charge; when set it is passed as
+# -analysis-threads, which overrides the config file.
+_analysis_threads = os.environ.get("ANALYSIS_THREADS")
+ANALYSIS_THREADS = int(_analysis_threads) if _analysis_threads else None
+
 # Analysis settings
 ANALYSIS_VISITS = int(os.environ.get("ANALYSIS_VISITS", "100"))
 MAX_VARIATIONS = int(os.environ.get("MAX_VARIATIONS", "5"))
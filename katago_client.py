@@ -3,20 +3,145 @@ KataGo Analysis Engine Client.
 
 Communicates with KataGo using the Analysis Engine JSON protocol.
 """
+import io
 import json
 import os
 import sys
+import time
+import select
 import subprocess
 import threading
 import queue
-import uuid
-from typing import Optional, Dict, Any, List, Tuple
+import itertools
+import signal
+from array import array
+from collections import deque
+from operator import itemgetter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Tuple, Sequence
 from dataclasses import dataclass, field
 
-from sgf_reader import GameState, coord_to_gtp, gtp_to_coord
+from sgf_reader import GameState, gtp_to_coord, gtp_table
 
+try:
+    import orjson
+    
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    # orjson is optional; fall back to the stdlib encoder with the same
+    # bytes-in / bytes-out interface.
+    _json_loads = json.loads
+    
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+
+# Size of each read from KataGo's stdout; large enough to pull a full
+# 19x19 ownership response in one syscall.
+_READ_CHUNK_SIZE = 65536
+
+# Bytes written to the I/O thread's wake-up pipe: stop the thread, or
+# take stdout back after a caller finished reading it directly
+_WAKE_STOP = b"\0"
+_WAKE_STDOUT = b"\1"
+
+# Line KataGo writes to stderr once the analysis engine accepts queries
+_READY_MARKER = b"ready to begin handling requests"
+
+# Ownership is stored as signed bytes: value = round(ownership * OWNERSHIP_SCALE)
+OWNERSHIP_SCALE = 127
+
+# format_ownership_map() buckets (+/-0.6 and +/-0.2) on the int8 scale
+_OWN_STRONG = 76
+_OWN_WEAK = 25
+
+
+def _ownership_char(own: int) -> str:
+    """Territory map character for one int8 ownership value."""
+    if own > _OWN_STRONG:
+        return "B"
+    if own > _OWN_WEAK:
+        return "b"
+    if own < -_OWN_STRONG:
+        return "W"
+    if own < -_OWN_WEAK:
+        return "w"
+    return "."
+
+
+# Translation table from the raw bytes of an int8 ownership array
+# (two's complement) straight to territory map characters
+_OWNERSHIP_CHARS = "".join(
+    _ownership_char(byte - 256 if byte > 127 else byte) for byte in range(256)
+).encode("ascii")
+
+
+def quantize_ownership(ownership: Sequence[float]) -> array:
+    """Quantize KataGo ownership values (-1 to 1) to int8, see OWNERSHIP_SCALE."""
+    return array("b", [round(own * OWNERSHIP_SCALE) for own in ownership])
+
+
+def _player_at_turn(state: GameState, turn_number: int) -> str:
+    """Get the player to move at a turn of the game ('B' or 'W')."""
+    # Earlier turns have the player of the next game move to play
+    if turn_number < len(state.moves):
+        return state.moves[turn_number][0]
+    return state.current_player
+
+
+# On Linux, have the kernel send KataGo SIGTERM when this process dies so a
+# crashed server never leaves an orphaned engine holding the model in memory.
+# The kernel ties PR_SET_PDEATHSIG to the *thread* that forked the child, so
+# KataGo is spawned from a thread that lives as long as it does (see
+# KataGoClient._spawn), never from the short-lived caller of start().
+_PR_SET_PDEATHSIG = 1
+_prctl = None
+if sys.platform == "linux":
+    try:
+        import ctypes
+        _prctl = ctypes.CDLL("libc.so.6", use_errno=True).prctl
+    except (ImportError, OSError, AttributeError):
+        _prctl = None
+
+
+def _make_preexec_fn():
+    """Build the preexec_fn that ties the KataGo process to our lifetime."""
+    if _prctl is None:
+        return None
+    parent_pid = os.getpid()
+    
+    def _die_with_parent() -> None:
+        _prctl(_PR_SET_PDEATHSIG, signal.SIGTERM)
+        # The parent may have exited before prctl() took effect
+        if os.getppid() != parent_pid:
+            os.kill(os.getpid(), signal.SIGTERM)
+    
+    return _die_with_parent
+
+
+# How often a caller waiting on a multi-turn query checks for new turns
+_BATCH_PROGRESS_POLL = 1.0
+
+# Seconds stop() gives KataGo to exit after SIGTERM before killing it
+_STOP_TIMEOUT = 5.0
+
+# Number of recent KataGo stderr lines kept for error reports
+_STDERR_HISTORY = 200
+
+# SGF rule names understood by KataGo
+_RULES = {
+    "chinese": "chinese",
+    "japanese": "japanese",
+    "korean": "korean",
+    "aga": "aga",
+    "nz": "nz",
+    "tromp-taylor": "tromp-taylor",
+    "stone-scoring": "stone-scoring",
+}
 
-@dataclass
+
+@dataclass(slots=True)
 class MoveInfo:
     """Information about a candidate move from KataGo analysis."""
     move: str  # GTP format (e.g., "Q16")
@@ -28,7 +153,7 @@ class MoveInfo:
     utility: float = 0.0
 
 
-@dataclass  
+@dataclass(slots=True)
 class AnalysisResult:
     """Result of KataGo position analysis."""
     id: str
@@ -43,11 +168,18 @@ class AnalysisResult:
     # Top moves
     move_infos: List[MoveInfo] = field(default_factory=list)
     
-    # Territory ownership (-1 to 1, negative = white)
-    ownership: Optional[List[float]] = None
+    # Territory ownership as int8 (-127 to 127, negative = white),
+    # see OWNERSHIP_SCALE and ownership_values()
+    ownership: Optional[array] = None
     
-    # Raw response for debugging
+    # Raw response for debugging (only kept when requested)
     raw_response: Optional[Dict] = None
+    
+    def ownership_values(self) -> Optional[List[float]]:
+        """Decode ownership back to floats (-1 to 1, negative = white)."""
+        if self.ownership is None:
+            return None
+        return [own / OWNERSHIP_SCALE for own in self.ownership]
 
 
 class KataGoClient:
@@ -58,24 +190,47 @@ class KataGoClient:
         katago_path: str,
         model_path: str,
         config_path: str,
-        analysis_threads: int = 2,
-        debug: bool = False
+        analysis_threads: Optional[int] = None,
+        debug: bool = False,
+        startup_timeout: float = 30.0,
     ):
         self.katago_path = katago_path
         self.model_path = model_path
         self.config_path = config_path
         self.analysis_threads = analysis_threads
         self.debug = debug
+        self.startup_timeout = startup_timeout
         
         self.process: Optional[subprocess.Popen] = None
         self.response_queue: queue.Queue = queue.Queue()
-        self.pending_requests: Dict[str, threading.Event] = {}
-        self.responses: Dict[str, Dict] = {}
-        self._reader_thread: Optional[threading.Thread] = None
-        self._stderr_thread: Optional[threading.Thread] = None
-        self._lock = threading.Lock()
+        # One future per in-flight request, fulfilled by the reader thread.
+        # Plain dict operations are atomic under the GIL, so no lock is needed.
+        self._futures: Dict[str, Future] = {}
+        # Multi-turn requests: id -> (expected response count, responses by turn)
+        self._batches: Dict[str, Tuple[int, Dict[int, Dict]]] = {}
+        # Request ids only need to be unique among this client's queries
+        self._id_counter = itertools.count(1)
+        # (signature, query) for the last query shape built; only the id,
+        # moves and analyzeTurns change between analyses of the same game.
+        self._query_template: Optional[Tuple[Tuple, Dict]] = None
+        self._io_thread: Optional[threading.Thread] = None
+        # Self-pipe used by stop() to wake the I/O thread out of select()
+        self._wake_fds: Optional[Tuple[int, int]] = None
+        self._stdin_fd: Optional[int] = None
+        # With a single request in flight, the waiting caller reads stdout
+        # itself instead of waiting on the I/O thread (see _read_directly).
+        # Whoever holds _stdout_lock owns stdout and its framing buffer.
+        self._single_threaded = True
+        self._stdout_lock = threading.Lock()
+        self._stdout_fd: Optional[int] = None
+        self._stdout_buf = bytearray()
+        # Serializes writers so large queries are never interleaved on the pipe
+        self._write_lock = threading.Lock()
         self._startup_error: Optional[str] = None
-        self._stderr_lines: List[str] = []
+        self._stderr_lines: deque = deque(maxlen=_STDERR_HISTORY)
+        # Set once KataGo prints its readiness line, which may come after
+        # start() returned if loading outlasts startup_timeout
+        self._ready = False
         
     def start(self) -> None:
         """Start the KataGo analysis engine process."""
@@ -83,6 +238,9 @@ class KataGoClient:
             return
             
         self._startup_error = None
+        self._ready = False
+        # Release the I/O thread of a previous process that exited on its own
+        self._stop_io_thread()
         
         if not os.path.exists(self.katago_path):
             self._startup_error = f"KataGo executable not found: {self.katago_path}"
@@ -97,156 +255,471 @@ class KataGoClient:
             "analysis",
             "-model", self.model_path,
             "-config", self.config_path,
-            "-analysis-threads", str(self.analysis_threads),
         ]
+        # Unless set explicitly, numAnalysisThreads from the config applies
+        if self.analysis_threads is not None:
+            cmd += ["-analysis-threads", str(self.analysis_threads)]
         
         try:
-            self.process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-            )
+            self.process = self._spawn(cmd)
         except Exception as e:
             self._startup_error = f"Failed to start KataGo: {e}"
             raise RuntimeError(self._startup_error) from e
         
-        import time
-        time.sleep(0.5)
+        self._wait_until_ready()
         
         if self.process.poll() is not None:
-            stderr_output = self.process.stderr.read() if self.process.stderr else ""
+            remaining = self.process.stderr.read().decode("utf-8", errors="replace")
+            stderr_output = "\n".join([*self._stderr_lines, remaining]).strip()
             self._startup_error = f"KataGo process died immediately. Stderr: {stderr_output}"
             raise RuntimeError(self._startup_error)
         
-        self._reader_thread = threading.Thread(target=self._read_responses, daemon=True)
-        self._reader_thread.start()
+        self._stdin_fd = self.process.stdin.fileno()
+        self._stdout_fd = self.process.stdout.fileno()
+        self._stdout_buf = bytearray()
+        os.set_blocking(self._stdout_fd, False)
+        self._wake_fds = os.pipe()
+        
+        self._io_thread = threading.Thread(
+            target=self._io_loop,
+            args=(self.process, self._wake_fds[0]),
+            daemon=True,
+        )
+        self._io_thread.start()
+        
+    @staticmethod
+    def _spawn(cmd: List[str]) -> subprocess.Popen:
+        """
+        Launch KataGo from a thread that stays alive until KataGo exits.
         
-        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
-        self._stderr_thread.start()
+        The parent-death signal fires when the forking thread exits, and
+        start() is usually called from a pool worker (FastMCP runs sync
+        tools on anyio worker threads that retire when idle), so forking
+        there would kill the engine with its thread. The owner thread just
+        reaps the process once it exits.
+        """
+        spawned: Future = Future()
         
-    def _read_stderr(self) -> None:
-        """Background thread to read stderr from KataGo."""
-        while self.process and self.process.stderr:
+        def _own_process() -> None:
             try:
-                line = self.process.stderr.readline()
-                if not line:
-                    break
-                line = line.strip()
-                if line and self.debug:
-                    print(f"[KataGo stderr] {line}", file=sys.stderr)
-                self._stderr_lines.append(line)
-            except Exception:
+                process = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    # Queries and responses go through the raw fds (os.write /
+                    # os.read), so the file objects keep the default buffering
+                    bufsize=-1,
+                    close_fds=True,
+                    preexec_fn=_make_preexec_fn(),
+                )
+            except BaseException as e:
+                spawned.set_exception(e)
+                return
+            spawned.set_result(process)
+            process.wait()
+        
+        threading.Thread(target=_own_process, name="katago-owner", daemon=True).start()
+        return spawned.result()
+    
+    def _wait_until_ready(self) -> None:
+        """
+        Block until KataGo reports it is ready, dies, or startup_timeout expires.
+        
+        Stderr is read here on the calling thread; lines are kept in
+        _stderr_lines so startup errors can be reported. If the timeout
+        expires while the process is still alive, startup continues and
+        queries simply queue in the pipe until KataGo is ready.
+        """
+        fd = self.process.stderr.fileno()
+        deadline = time.monotonic() + self.startup_timeout
+        pending = bytearray()
+        
+        while not self._ready and self.process.poll() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if self.debug:
+                    print("[KataGo] No readiness line before startup timeout, continuing", file=sys.stderr)
+                break
+            
+            readable, _, _ = select.select([fd], [], [], min(remaining, 0.05))
+            if not readable:
+                continue
+            
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                # Stderr closed: KataGo is exiting, give it a moment to be reaped
+                try:
+                    self.process.wait(timeout=1.0)
+                except subprocess.TimeoutExpired:
+                    pass
                 break
+            
+            for line in self._split_frames(pending, chunk):
+                self._handle_stderr_line(line)
+        
+        if pending:
+            self._handle_stderr_line(pending)
+        
+    def _handle_stderr_line(self, line: bytes) -> None:
+        """Record a line of KataGo's stderr, noting when it reports ready."""
+        if _READY_MARKER in line:
+            self._ready = True
+        text = line.decode("utf-8", errors="replace").strip()
+        if text and self.debug:
+            print(f"[KataGo stderr] {text}", file=sys.stderr)
+        self._stderr_lines.append(text)
+    
+    def _stderr_tail(self, n: int) -> List[str]:
+        """Get the last n recorded stderr lines."""
+        lines = self._stderr_lines
+        return list(itertools.islice(lines, max(0, len(lines) - n), None))
     
     def _is_alive(self) -> bool:
         """Check if the KataGo process is alive."""
         return self.process is not None and self.process.poll() is None
+    
+    def _is_ready(self) -> bool:
+        """Check if the running KataGo process has finished loading."""
+        return self._ready and self._is_alive()
         
     def stop(self) -> None:
         """Stop the KataGo process."""
         if self.process is not None:
             self.process.terminate()
-            self.process.wait()
+            try:
+                self.process.wait(timeout=_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                # Hung hard enough to ignore SIGTERM
+                self.process.kill()
+                self.process.wait()
             self.process = None
+        self._stop_io_thread()
+    
+    def _stop_io_thread(self) -> None:
+        """Wake the I/O thread, wait for it to exit and release its pipe."""
+        if self._wake_fds is None:
+            return
+        os.write(self._wake_fds[1], _WAKE_STOP)
+        if self._io_thread is not None:
+            self._io_thread.join(timeout=5.0)
+            self._io_thread = None
+        for fd in self._wake_fds:
+            os.close(fd)
+        self._wake_fds = None
             
-    def _read_responses(self) -> None:
-        """Background thread to read responses from KataGo."""
-        while self.process and self.process.stdout:
+    @staticmethod
+    def _split_frames(buf: bytearray, chunk: bytes) -> List[bytearray]:
+        """
+        Append chunk to buf and remove every complete newline-terminated frame.
+        
+        Only the newly appended bytes are scanned for frame boundaries, so
+        each byte is looked at once however the data is chunked.
+        """
+        start = len(buf)
+        buf += chunk
+        frames = []
+        consumed = 0
+        idx = buf.find(b"\n", start)
+        while idx != -1:
+            frames.append(buf[consumed:idx])
+            consumed = idx + 1
+            idx = buf.find(b"\n", consumed)
+        if consumed:
+            del buf[:consumed]
+        return frames
+    
+    def _io_loop(self, process: subprocess.Popen, wake_fd: int) -> None:
+        """
+        Background thread serving both of KataGo's output pipes.
+        
+        A single select() waits on stdout, stderr and the wake-up pipe, so
+        one thread handles responses and log lines. Responses are
+        newline-delimited JSON, read in large binary chunks from
+        non-blocking fds. The loop ends when both pipes reach EOF or stop()
+        writes to the wake-up pipe.
+        
+        While a caller owns stdout (see _read_directly) it is left out of
+        the select set, so stderr keeps being drained; the caller writes
+        to the wake-up pipe when it hands stdout back. This thread never
+        blocks on _stdout_lock.
+        """
+        out_fd = process.stdout.fileno()
+        err_fd = process.stderr.fileno()
+        os.set_blocking(err_fd, False)
+        
+        handlers = {
+            out_fd: (self._stdout_buf, self._handle_response),
+            err_fd: (bytearray(), self._handle_stderr_line),
+        }
+        
+        while handlers:
+            watched = [fd for fd in handlers if fd != out_fd or not self._stdout_lock.locked()]
+            watched.append(wake_fd)
             try:
-                line = self.process.stdout.readline()
-                if not line:
-                    break
-                    
-                line = line.strip()
-                if not line:
-                    continue
-                
+                readable, _, _ = select.select(watched, [], [])
+            except (OSError, ValueError) as e:
                 if self.debug:
-                    print(f"[KataGo stdout] {line[:200]}...", file=sys.stderr)
-                    
-                try:
-                    response = json.loads(line)
-                    request_id = response.get("id")
-                    
-                    if self.debug:
-                        print(f"[KataGo] Received response for request {request_id}", file=sys.stderr)
-                    
-                    if request_id:
-                        with self._lock:
-                            self.responses[request_id] = response
-                            if request_id in self.pending_requests:
-                                self.pending_requests[request_id].set()
-                                
-                except json.JSONDecodeError as e:
-                    if self.debug:
-                        print(f"[KataGo] JSON decode error: {e}", file=sys.stderr)
-                    continue
-                    
-            except Exception as e:
-                if self.debug:
-                    print(f"[KataGo] Reader exception: {e}", file=sys.stderr)
+                    print(f"[KataGo] I/O thread exception: {e}", file=sys.stderr)
                 break
+            
+            if wake_fd in readable:
+                if _WAKE_STOP in os.read(wake_fd, 512):
+                    break
+                # Otherwise stdout was handed back; watch it again
+                continue
+            
+            for fd in readable:
+                if fd == out_fd:
+                    # A caller may have taken stdout since select() started;
+                    # leave it to them rather than wait
+                    if not self._stdout_lock.acquire(blocking=False):
+                        continue
+                    try:
+                        eof = self._read_frames(fd, *handlers[fd])
+                    finally:
+                        self._stdout_lock.release()
+                else:
+                    eof = self._read_frames(fd, *handlers[fd])
+                if eof:
+                    del handlers[fd]
+        
+        # No more responses can arrive from this process
+        self._fail_pending("KataGo process exited before responding")
+    
+    def _read_frames(self, fd: int, buf: bytearray, handle) -> bool:
+        """Read what is available on a non-blocking fd and handle each complete line; True at EOF."""
+        try:
+            chunk = os.read(fd, _READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            if self.debug:
+                print(f"[KataGo] Reader exception: {e}", file=sys.stderr)
+            return True
+        
+        if not chunk:
+            return True
+        for frame in self._split_frames(buf, chunk):
+            handle(frame)
+        return False
+    
+    def _read_directly(self, future: Future, deadline: float) -> None:
+        """
+        Serve stdout on the calling thread until future is resolved.
+        
+        Used when a single request is in flight, which saves the hand-off
+        from the I/O thread. Responses to other requests read here are
+        dispatched as usual. Returns early, leaving the rest to the I/O
+        thread, if stdout is already being read, at EOF, or the deadline
+        passes.
+        """
+        if not self._stdout_lock.acquire(blocking=False):
+            return
+        try:
+            fd = self._stdout_fd
+            while not future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    readable, _, _ = select.select([fd], [], [], remaining)
+                except (OSError, ValueError):
+                    return
+                if readable and self._read_frames(fd, self._stdout_buf, self._handle_response):
+                    return
+        finally:
+            self._stdout_lock.release()
+            # The I/O thread stopped watching stdout while we owned it
+            wake_fds = self._wake_fds
+            if wake_fds is not None:
+                try:
+                    os.write(wake_fds[1], _WAKE_STDOUT)
+                except OSError:
+                    pass
+    
+    def _handle_response(self, frame: bytes) -> None:
+        """Decode a single response frame and fulfil its request's future."""
+        if not frame.strip():
+            return
+        
+        if self.debug:
+            print(f"[KataGo stdout] {frame[:200].decode('utf-8', errors='replace')}...", file=sys.stderr)
+        
+        try:
+            response = _json_loads(frame)
+        except json.JSONDecodeError as e:
+            if self.debug:
+                print(f"[KataGo] JSON decode error: {e}", file=sys.stderr)
+            return
+        
+        request_id = response.get("id")
+        
+        if self.debug:
+            print(f"[KataGo] Received response for request {request_id}", file=sys.stderr)
+        
+        if not request_id:
+            return
+        
+        if "warning" in response:
+            # Non-fatal notes about the query; the real response follows
+            if self.debug:
+                print(f"[KataGo] Warning for {request_id}: {response['warning']}", file=sys.stderr)
+            return
+        
+        future = self._futures.get(request_id)
+        if future is None or future.done():
+            return
+        
+        batch = self._batches.get(request_id)
+        if batch is None:
+            future.set_result(response)
+            return
+        
+        # KataGo answers a multi-turn query with one message per turn;
+        # resolve the future once every turn has arrived.
+        expected, received = batch
+        if "error" in response:
+            self._batches.pop(request_id, None)
+            future.set_exception(RuntimeError(response["error"]))
+            return
+        received[response.get("turnNumber")] = response
+        if len(received) >= expected:
+            self._batches.pop(request_id, None)
+            future.set_result(received)
                 
-    def _send_query(self, query: Dict) -> str:
-        """Send a query to KataGo and return the request ID."""
+    def _send_query(self, query: Dict, batch_size: Optional[int] = None) -> str:
+        """
+        Send a query to KataGo and return the request ID.
+        
+        When batch_size is given, the query is expected to produce that many
+        responses (one per analyzed turn) and its result is a dict of
+        responses keyed by turn number.
+        """
         if not self._is_alive():
+            # Anything still pending was sent to the dead process
+            self._fail_pending("KataGo process exited before responding")
             self.start()
         
         if not self._is_alive():
             raise RuntimeError(f"KataGo process failed to start: {self._startup_error}")
             
-        request_id = query.get("id", str(uuid.uuid4()))
-        query["id"] = request_id
+        request_id = query.get("id")
+        if request_id is None:
+            request_id = query["id"] = str(next(self._id_counter))
         
-        event = threading.Event()
-        with self._lock:
-            self.pending_requests[request_id] = event
+        if batch_size is not None:
+            self._batches[request_id] = (batch_size, {})
+        self._futures[request_id] = Future()
             
-        query_json = json.dumps(query)
+        payload = _json_dumps(query) + b"\n"
         
         if self.debug:
-            print(f"[KataGo] Sending query {request_id}: {query_json[:200]}...", file=sys.stderr)
+            print(f"[KataGo] Sending query {request_id}: {payload[:200].decode('utf-8', errors='replace')}...", file=sys.stderr)
         
         try:
-            self.process.stdin.write(query_json + "\n")
-            self.process.stdin.flush()
+            # Write the encoded query straight to the pipe; a blocking fd
+            # normally takes it in one syscall, but loop on short writes.
+            view = memoryview(payload)
+            with self._write_lock:
+                while view:
+                    written = os.write(self._stdin_fd, view)
+                    view = view[written:]
         except (BrokenPipeError, OSError) as e:
-            stderr_output = "\n".join(self._stderr_lines[-20:]) if self._stderr_lines else ""
+            stderr_output = "\n".join(self._stderr_tail(20)) if self._stderr_lines else ""
             
             error_msg = f"KataGo process died (broken pipe). Recent stderr:\n{stderr_output}"
-            with self._lock:
-                if request_id in self.pending_requests:
-                    del self.pending_requests[request_id]
+            self._futures.pop(request_id, None)
+            self._batches.pop(request_id, None)
             raise RuntimeError(error_msg) from e
         
         return request_id
         
     def _wait_for_response(self, request_id: str, timeout: float = 120.0) -> Optional[Dict]:
-        """Wait for a response to a specific request. Default timeout increased to 120s for large models."""
-        event = self.pending_requests.get(request_id)
-        if event is None:
+        """
+        Wait for a response to a specific request. Default timeout increased to 120s for large models.
+        
+        For a multi-turn request the timeout applies per turn: the deadline
+        is pushed back each time another turn's response arrives, so a long
+        batch only fails once KataGo stops making progress.
+        """
+        future = self._futures.get(request_id)
+        if future is None:
             return None
         
         if self.debug:
             print(f"[KataGo] Waiting up to {timeout}s for response to {request_id}", file=sys.stderr)
-            
-        if event.wait(timeout=timeout):
-            with self._lock:
-                response = self.responses.pop(request_id, None)
-                if self.debug:
-                    if response:
-                        print(f"[KataGo] Got response for {request_id}", file=sys.stderr)
-                    else:
-                        print(f"[KataGo] No response found for {request_id} (event was set but no data)", file=sys.stderr)
-                return response
+        
+        batch = self._batches.get(request_id)
+        received = batch[1] if batch is not None else None
+        seen = 0
+        deadline = time.monotonic() + timeout
+        
+        try:
+            while True:
+                now = time.monotonic()
+                if received is not None and len(received) > seen:
+                    seen = len(received)
+                    deadline = now + timeout
+                # Batches wake up regularly to notice progress
+                wait_until = deadline if received is None else min(deadline, now + _BATCH_PROGRESS_POLL)
+                
+                if self._single_threaded and len(self._futures) == 1:
+                    self._read_directly(future, wait_until)
+                try:
+                    response = future.result(timeout=max(0.0, wait_until - time.monotonic()))
+                    break
+                except FutureTimeoutError:
+                    progressed = received is not None and len(received) > seen
+                    if progressed or time.monotonic() < deadline:
+                        continue
+                    if self.debug:
+                        print(f"[KataGo] Timeout waiting for {request_id}", file=sys.stderr)
+                    return None
+        except RuntimeError as e:
+            if self.debug:
+                print(f"[KataGo] Request {request_id} failed: {e}", file=sys.stderr)
+            return None
+        finally:
+            self._futures.pop(request_id, None)
+            self._batches.pop(request_id, None)
         
         if self.debug:
-            print(f"[KataGo] Timeout waiting for {request_id}", file=sys.stderr)
+            print(f"[KataGo] Got response for {request_id}", file=sys.stderr)
+        return response
         
-        return None
+    def _fail_pending(self, reason: str) -> None:
+        """Fail every in-flight request so its waiter returns instead of timing out."""
+        for request_id in list(self._futures):
+            self._batches.pop(request_id, None)
+            future = self._futures.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError(reason))
+    
+    def ping(self, timeout: float = 2.0) -> Optional[float]:
+        """
+        Check that KataGo answers queries, using a query_version round trip.
+        
+        Args:
+            timeout: Seconds to wait for the reply
+            
+        Returns:
+            Round-trip latency in seconds, or None if KataGo did not answer
+        """
+        started = time.monotonic()
+        try:
+            request_id = self._send_query({"action": "query_version"})
+            response = self._wait_for_response(request_id, timeout=timeout)
+        except (RuntimeError, FileNotFoundError):
+            return None
+        
+        if response is None or "error" in response:
+            return None
+        
+        latency = time.monotonic() - started
+        if self.debug:
+            print(f"[KataGo] Ping {latency * 1000:.1f} ms (version {response.get('version')})", file=sys.stderr)
+        return latency
         
     def analyze_position(
         self,
@@ -255,6 +728,8 @@ class KataGoClient:
         include_ownership: bool = True,
         include_policy: bool = False,
         analysis_pv_len: int = 10,
+        keep_raw: bool = False,
+        top_n: Optional[int] = None,
     ) -> Optional[AnalysisResult]:
         """
         Analyze a position and return the analysis result.
@@ -265,10 +740,43 @@ class KataGoClient:
             include_ownership: Include territory ownership estimates
             include_policy: Include raw policy network output
             analysis_pv_len: Length of principal variations to return
+            keep_raw: Keep the parsed KataGo response in raw_response
+            top_n: Only keep the N most visited moves (default: all)
             
         Returns:
             AnalysisResult with analysis data, or None if failed
         """
+        response = self.analyze_position_raw(
+            state,
+            max_visits=max_visits,
+            include_ownership=include_ownership,
+            include_policy=include_policy,
+            analysis_pv_len=analysis_pv_len,
+        )
+        
+        if response is None:
+            return None
+            
+        return self._parse_response(response, state, keep_raw=keep_raw, top_n=top_n)
+        
+    def analyze_position_raw(
+        self,
+        state: GameState,
+        max_visits: int = 100,
+        include_ownership: bool = True,
+        include_policy: bool = False,
+        analysis_pv_len: int = 10,
+    ) -> Optional[Dict]:
+        """
+        Analyze a position and return KataGo's parsed JSON response as-is.
+        
+        Useful when the result is only rendered to text (see
+        format_analysis_result_from_raw), since no AnalysisResult or
+        MoveInfo objects are built.
+        
+        Returns:
+            KataGo response dict, or None if failed
+        """
         query = self._build_query(
             state, 
             max_visits=max_visits,
@@ -284,12 +792,68 @@ class KataGoClient:
         response = self._wait_for_response(request_id, timeout=120.0)
         
         if response is None:
-            stderr_tail = "\n".join(self._stderr_lines[-10:]) if self._stderr_lines else "(no stderr)"
+            stderr_tail = "\n".join(self._stderr_tail(10)) if self._stderr_lines else "(no stderr)"
             if self.debug:
                 print(f"[KataGo] Analysis failed. Recent stderr:\n{stderr_tail}", file=sys.stderr)
             return None
             
-        return self._parse_response(response, state)
+        return response
+        
+    def analyze_positions(
+        self,
+        state: GameState,
+        turns: List[int],
+        max_visits: int = 100,
+        include_ownership: bool = True,
+        include_policy: bool = False,
+        analysis_pv_len: int = 10,
+        top_n: Optional[int] = None,
+    ) -> Dict[int, AnalysisResult]:
+        """
+        Analyze several positions of the same game with a single KataGo query.
+        
+        All turns are sent in one query's analyzeTurns list, so KataGo can
+        search them in parallel and the game is only encoded and sent once.
+        
+        Args:
+            state: Game state whose move list defines the positions
+            turns: Turn numbers to analyze (0 = empty board, len(moves) = current)
+            max_visits: Maximum MCTS visits per position
+            include_ownership: Include territory ownership estimates
+            include_policy: Include raw policy network output
+            analysis_pv_len: Length of principal variations to return
+            top_n: Only keep the N most visited moves (default: all)
+            
+        Returns:
+            Dict mapping turn number to AnalysisResult; empty if the query failed
+        """
+        turns = sorted(set(turns))
+        if not turns:
+            return {}
+        
+        query = self._build_query(
+            state,
+            max_visits=max_visits,
+            include_ownership=include_ownership,
+            include_policy=include_policy,
+            analysis_pv_len=analysis_pv_len,
+            analyze_turns=turns,
+        )
+        
+        request_id = self._send_query(query, batch_size=len(turns))
+        # Each turn is a full search; the usual budget applies to each turn's
+        # response, so a stalled engine fails the batch within that time
+        responses = self._wait_for_response(request_id, timeout=120.0)
+        
+        if responses is None:
+            if self.debug:
+                print(f"[KataGo] Batch analysis of {len(turns)} turns failed", file=sys.stderr)
+            return {}
+        
+        return {
+            turn: self._parse_response(response, state, top_n=top_n)
+            for turn, response in sorted(responses.items())
+        }
         
     def _build_query(
         self,
@@ -298,84 +862,106 @@ class KataGoClient:
         include_ownership: bool = True,
         include_policy: bool = False,
         analysis_pv_len: int = 10,
+        analyze_turns: Optional[List[int]] = None,
     ) -> Dict:
-        """Build a KataGo analysis query from game state."""
+        """
+        Build a KataGo analysis query from game state.
+        
+        Analyzes the current position unless analyze_turns lists other turns.
+        """
         
         # Convert moves to KataGo format
-        moves = []
-        for color, coord in state.moves:
-            if coord is None:
-                move_str = "pass"
-            else:
-                move_str = coord_to_gtp(coord[0], coord[1], state.board_size)
-            moves.append([color, move_str])
-        
-        # Build initial stones from any setup in position
-        # (For simplicity, we're assuming all stones come from moves)
-        initial_stones = []
-        
-        # Map rules
-        rules_map = {
-            "chinese": "chinese",
-            "japanese": "japanese", 
-            "korean": "korean",
-            "aga": "aga",
-            "nz": "nz",
-            "tromp-taylor": "tromp-taylor",
-            "stone-scoring": "stone-scoring",
-        }
-        rules = rules_map.get(state.rules.lower(), "chinese")
-        
-        query = {
-            "id": str(uuid.uuid4()),
-            "moves": moves,
-            "initialStones": initial_stones,
-            "rules": rules,
-            "komi": state.komi,
-            "boardXSize": state.board_size,
-            "boardYSize": state.board_size,
-            "analyzeTurns": [len(moves)],  # Analyze current position
-            "maxVisits": max_visits,
-            "analysisPVLen": analysis_pv_len,
-            "includeOwnership": include_ownership,
-            "includePolicy": include_policy,
-        }
+        gtp = gtp_table(state.board_size)
+        moves = [
+            [color, "pass" if coord is None else gtp[coord[0]][coord[1]]]
+            for color, coord in state.moves
+        ]
+        
+        rules = _RULES.get(state.rules.lower(), "chinese")
+        
+        signature = (
+            state.board_size, rules, state.komi,
+            include_ownership, include_policy, analysis_pv_len, max_visits,
+        )
+        cached = self._query_template
+        if cached is not None and cached[0] == signature:
+            template = cached[1]
+        else:
+            template = {
+                "id": None,
+                "moves": None,
+                # Build initial stones from any setup in position
+                # (For simplicity, we're assuming all stones come from moves)
+                "initialStones": [],
+                "rules": rules,
+                "komi": state.komi,
+                "boardXSize": state.board_size,
+                "boardYSize": state.board_size,
+                "analyzeTurns": None,
+                "maxVisits": max_visits,
+                "analysisPVLen": analysis_pv_len,
+                "includeOwnership": include_ownership,
+                "includePolicy": include_policy,
+            }
+            self._query_template = (signature, template)
+        
+        query = template.copy()
+        query["id"] = str(next(self._id_counter))
+        query["moves"] = moves
+        query["analyzeTurns"] = analyze_turns if analyze_turns is not None else [len(moves)]
         
         return query
         
-    def _parse_response(self, response: Dict, state: GameState) -> AnalysisResult:
-        """Parse KataGo response into AnalysisResult."""
+    def _parse_response(
+        self,
+        response: Dict,
+        state: GameState,
+        keep_raw: bool = False,
+        top_n: Optional[int] = None,
+    ) -> AnalysisResult:
+        """
+        Parse KataGo response into AnalysisResult.
+        
+        Ownership is quantized to int8 (see OWNERSHIP_SCALE), which is
+        plenty for territory display and a fraction of the size of a list
+        of floats. The response itself is only retained when keep_raw is set.
+        """
         
         root_info = response.get("rootInfo", {})
         move_infos_raw = response.get("moveInfos", [])
         
-        # Parse move infos
-        move_infos = []
-        for mi in move_infos_raw:
-            move_info = MoveInfo(
+        # Sort the raw entries by visits (most visited = best move) and
+        # only build MoveInfo objects for the ones we keep
+        move_infos_raw = sorted(move_infos_raw, key=itemgetter("visits"), reverse=True)
+        if top_n is not None:
+            move_infos_raw = move_infos_raw[:top_n]
+        
+        move_infos = [
+            MoveInfo(
                 move=mi.get("move", ""),
-                visits=mi.get("visits", 0),
+                visits=mi["visits"],
                 winrate=mi.get("winrate", 0.5),
                 score_lead=mi.get("scoreLead", 0.0),
                 pv=mi.get("pv", []),
                 prior=mi.get("prior", 0.0),
                 utility=mi.get("utility", 0.0),
             )
-            move_infos.append(move_info)
+            for mi in move_infos_raw
+        ]
         
-        # Sort by visits (most visited = best move)
-        move_infos.sort(key=lambda x: x.visits, reverse=True)
+        turn_number = response.get("turnNumber", len(state.moves))
+        ownership = response.get("ownership") if keep_raw else response.pop("ownership", None)
         
         result = AnalysisResult(
             id=response.get("id", ""),
-            turn_number=response.get("turnNumber", len(state.moves)),
-            current_player=state.current_player,
+            turn_number=turn_number,
+            current_player=_player_at_turn(state, turn_number),
             root_winrate=root_info.get("winrate", 0.5),
             root_score_lead=root_info.get("scoreLead", 0.0),
             root_visits=root_info.get("visits", 0),
             move_infos=move_infos,
-            ownership=response.get("ownership"),
-            raw_response=response,
+            ownership=quantize_ownership(ownership) if ownership else None,
+            raw_response=response if keep_raw else None,
         )
         
         return result
@@ -383,85 +969,118 @@ class KataGoClient:
 
 def format_analysis_result(result: AnalysisResult, state: GameState, top_n: int = 5) -> str:
     """Format analysis result as human-readable text."""
-    lines = []
+    moves = [
+        (mi.move, mi.winrate, mi.score_lead, mi.pv)
+        for mi in result.move_infos[:top_n]
+    ]
+    return _format_analysis_text(
+        result.current_player, result.root_winrate, result.root_score_lead, moves, state
+    )
+
+
+def format_analysis_result_from_raw(response: Dict, state: GameState, top_n: int = 5) -> str:
+    """
+    Format a raw KataGo response (see analyze_position_raw) as human-readable text.
+    
+    Produces the same text as format_analysis_result() without building
+    the intermediate dataclasses.
+    """
+    root_info = response.get("rootInfo", {})
+    move_infos_raw = sorted(response.get("moveInfos", []), key=itemgetter("visits"), reverse=True)
+    moves = [
+        (mi.get("move", ""), mi.get("winrate", 0.5), mi.get("scoreLead", 0.0), mi.get("pv", []))
+        for mi in move_infos_raw[:top_n]
+    ]
+    current_player = _player_at_turn(state, response.get("turnNumber", len(state.moves)))
+    return _format_analysis_text(
+        current_player, root_info.get("winrate", 0.5), root_info.get("scoreLead", 0.0), moves, state
+    )
+
+
+def _format_analysis_text(
+    current_player: str,
+    root_winrate: float,
+    root_score_lead: float,
+    moves: List[Tuple[str, float, float, List[str]]],
+    state: GameState,
+) -> str:
+    """Render position evaluation and (move, winrate, score_lead, pv) candidates."""
+    buf = io.StringIO()
+    w = buf.write
     
     # Current position evaluation
-    current = "Black" if result.current_player == "B" else "White"
-    winrate_pct = result.root_winrate * 100
+    current = "Black" if current_player == "B" else "White"
+    winrate_pct = root_winrate * 100
     
     # Determine who is winning
-    if result.current_player == "B":
+    if current_player == "B":
         black_winrate = winrate_pct
         white_winrate = 100 - winrate_pct
-        score_for_black = result.root_score_lead
+        score_for_black = root_score_lead
     else:
         white_winrate = winrate_pct
         black_winrate = 100 - winrate_pct
-        score_for_black = -result.root_score_lead
+        score_for_black = -root_score_lead
     
-    lines.append(f"=== Position Analysis (Move {len(state.moves)}) ===")
-    lines.append(f"Turn: {current} to play")
-    lines.append("")
-    lines.append(f"Win Rate: Black {black_winrate:.1f}% - White {white_winrate:.1f}%")
+    w(f"=== Position Analysis (Move {len(state.moves)}) ===\n")
+    w(f"Turn: {current} to play\n")
+    w("\n")
+    w(f"Win Rate: Black {black_winrate:.1f}% - White {white_winrate:.1f}%\n")
     
     if score_for_black > 0:
-        lines.append(f"Score: Black leads by {abs(score_for_black):.1f} points")
+        w(f"Score: Black leads by {abs(score_for_black):.1f} points\n")
     elif score_for_black < 0:
-        lines.append(f"Score: White leads by {abs(score_for_black):.1f} points")
+        w(f"Score: White leads by {abs(score_for_black):.1f} points\n")
     else:
-        lines.append(f"Score: Even position")
+        w(f"Score: Even position\n")
     
-    lines.append("")
-    lines.append(f"=== Top {min(top_n, len(result.move_infos))} Recommended Moves ===")
+    w("\n")
+    w(f"=== Top {len(moves)} Recommended Moves ===")
     
-    for i, mi in enumerate(result.move_infos[:top_n], 1):
-        wr_pct = mi.winrate * 100
-        pv_str = " → ".join(mi.pv[:5]) if mi.pv else ""
+    # Each move block starts with the blank separator line
+    for i, (move, winrate, score_lead, pv) in enumerate(moves, 1):
+        wr_pct = winrate * 100
+        pv_str = " → ".join(pv[:5]) if pv else ""
         
-        lines.append(f"{i}. {mi.move}")
-        lines.append(f"   Win rate: {wr_pct:.1f}%, Score: {mi.score_lead:+.1f}")
+        w(f"\n{i}. {move}\n")
+        w(f"   Win rate: {wr_pct:.1f}%, Score: {score_lead:+.1f}\n")
         if pv_str:
-            lines.append(f"   Variation: {pv_str}")
-        lines.append("")
+            w(f"   Variation: {pv_str}\n")
     
-    return "\n".join(lines)
+    return buf.getvalue()
 
 
-def format_ownership_map(ownership: List[float], board_size: int) -> str:
-    """Format ownership data as ASCII territory map."""
+def format_ownership_map(ownership: Sequence[int], board_size: int) -> str:
+    """Format int8-quantized ownership data (see OWNERSHIP_SCALE) as ASCII territory map."""
     if not ownership or len(ownership) != board_size * board_size:
         return "Ownership data not available"
     
-    lines = []
-    lines.append("=== Territory Map ===")
-    lines.append("(B = Black territory, W = White territory, . = neutral)")
-    lines.append("")
+    buf = io.StringIO()
+    w = buf.write
+    w("=== Territory Map ===\n")
+    w("(B = Black territory, W = White territory, . = neutral)\n")
+    w("\n")
     
     letters = "ABCDEFGHJKLMNOPQRST"[:board_size]
-    lines.append(f"   {' '.join(letters)}")
+    header = f"   {' '.join(letters)}"
+    w(header)
+    
+    # Classify every point at once by translating the int8 bytes through
+    # a lookup table and poke them into every other byte of a space-filled
+    # buffer, so each row is already space separated
+    if not isinstance(ownership, array):
+        ownership = array("b", ownership)
+    spaced = bytearray(b" ") * (2 * len(ownership))
+    spaced[::2] = ownership.tobytes().translate(_OWNERSHIP_CHARS)
+    cells = spaced.decode("ascii")
     
+    row_width = 2 * board_size
     for row in range(board_size):
         row_num = board_size - row
-        row_str = f"{row_num:2d} "
-        
-        for col in range(board_size):
-            idx = row * board_size + col
-            own = ownership[idx]
-            
-            if own > 0.6:
-                row_str += "B "
-            elif own > 0.2:
-                row_str += "b "
-            elif own < -0.6:
-                row_str += "W "
-            elif own < -0.2:
-                row_str += "w "
-            else:
-                row_str += ". "
-        
-        row_str += f"{row_num:2d}"
-        lines.append(row_str)
-    
-    lines.append(f"   {' '.join(letters)}")
-    
-    return "\n".join(lines)
\ No newline at end of file
+        start = row * row_width
+        w(f"\n{row_num:2d} {cells[start:start + row_width - 1]} {row_num:2d}")
+    
+    w("\n")
+    w(header)
+    
+    return buf.getvalue()
@@ -9,6 +9,9 @@ This server exposes tools for:
 """
 import os
 import sys
+import atexit
+import threading
+import time
 from typing import Optional
 
 from fastmcp import FastMCP
@@ -18,6 +21,8 @@ from config import (
     KATAGO_PATH,
     KATAGO_MODEL,
     KATAGO_CONFIG,
+    KATAGO_STARTUP_TIMEOUT,
+    ANALYSIS_THREADS,
     SGF_WATCH_PATH,
     ANALYSIS_VISITS,
     MAX_VARIATIONS,
@@ -26,17 +31,20 @@ from config import (
 )
 from sgf_reader import (
     find_latest_sgf,
-    read_sgf_file,
-    board_to_ascii,
-    format_move_history,
+    scan_sgf_files,
+    read_sgf_file_cached,
+    write_board_ascii,
+    write_move_history,
     get_game_info,
+    list_stones,
     coord_to_gtp,
     GameState,
 )
 from katago_client import (
     KataGoClient,
-    format_analysis_result,
+    format_analysis_result_from_raw,
     format_ownership_map,
+    quantize_ownership,
 )
 
 
@@ -45,25 +53,62 @@ mcp = FastMCP("KataGo Go Coach")
 
 # Global KataGo client (lazy initialization)
 _katago_client: Optional[KataGoClient] = None
+# Tool calls may run concurrently; only one of them may create or restart the client
+_katago_client_lock = threading.Lock()
 
 
 def get_katago_client() -> KataGoClient:
-    """Get or create the KataGo client."""
+    """
+    Get or create the KataGo client.
+    
+    The client and its KataGo process are kept warm across tool calls. On
+    every call a process that has finished loading is health-checked with
+    a ping (a query_version round trip, answered without waiting for
+    running searches); if it has exited, or is ready but no longer
+    answers, it is stopped and started again. A process that is still
+    loading is left alone: its queries wait in the pipe under the normal
+    query timeout. A single process serves every tool, since KataGo
+    already analyzes ANALYSIS_THREADS positions in parallel.
+    """
     global _katago_client
-    if _katago_client is None:
-        _katago_client = KataGoClient(
-            katago_path=KATAGO_PATH,
-            model_path=KATAGO_MODEL,
-            config_path=KATAGO_CONFIG,
-        )
+    with _katago_client_lock:
+        if _katago_client is None:
+            _katago_client = KataGoClient(
+                katago_path=KATAGO_PATH,
+                model_path=KATAGO_MODEL,
+                config_path=KATAGO_CONFIG,
+                analysis_threads=ANALYSIS_THREADS,
+                startup_timeout=KATAGO_STARTUP_TIMEOUT,
+            )
+            atexit.register(_katago_client.stop)
+        if _katago_client._is_alive():
+            # Still loading (slower than KATAGO_STARTUP_TIMEOUT): restarting
+            # would only throw that work away
+            if not _katago_client._is_ready():
+                return _katago_client
+            if _katago_client.ping() is not None:
+                return _katago_client
+        
+        # Never started, exited, or ready but hung: replace the process
+        _katago_client.stop()
         _katago_client.start()
-    return _katago_client
+        if not _katago_client._is_alive() or (
+            _katago_client._is_ready() and _katago_client.ping() is None
+        ):
+            # E.g. died right after starting because the GPU was still held
+            # by the old process; one more attempt
+            _katago_client.stop()
+            _katago_client.start()
+        return _katago_client
 
 
 def get_current_game() -> tuple[GameState, str]:
     """
     Get the current game state from the most recent SGF file.
     
+    The parsed game is cached (see read_sgf_file_cached), so callers must
+    treat the returned state as read-only.
+    
     Returns:
         Tuple of (GameState, filepath)
     """
@@ -74,7 +119,7 @@ def get_current_game() -> tuple[GameState, str]:
             "Please save your game in Sabaki first."
         )
     
-    state = read_sgf_file(sgf_path)
+    state = read_sgf_file_cached(sgf_path)
     return state, sgf_path
 
 
@@ -84,23 +129,18 @@ def format_stone_positions(state: GameState) -> str:
     
     Returns a string listing all black and white stones on the board.
     """
-    black_stones = []
-    white_stones = []
-    
-    for row in range(state.board_size):
-        for col in range(state.board_size):
-            stone = state.board[row][col]
-            if stone == 'B':
-                black_stones.append(coord_to_gtp(row, col, state.board_size))
-            elif stone == 'W':
-                white_stones.append(coord_to_gtp(row, col, state.board_size))
-    
     lines = []
+    write_stone_positions(state, lines)
+    return "\n".join(lines)
+
+
+def write_stone_positions(state: GameState, lines: list[str]) -> None:
+    """Append the lines of format_stone_positions() to lines."""
+    black_stones, white_stones = list_stones(state)
+    
     lines.append("=== Stone Positions ===")
     lines.append(f"Black stones ({len(black_stones)}): {', '.join(black_stones) if black_stones else 'none'}")
     lines.append(f"White stones ({len(white_stones)}): {', '.join(white_stones) if white_stones else 'none'}")
-    
-    return "\n".join(lines)
 
 
 # ============================================================================
@@ -260,7 +300,7 @@ def get_board_state(sgf_path: Optional[str] = None) -> str:
     """
     try:
         if sgf_path:
-            state = read_sgf_file(sgf_path)
+            state = read_sgf_file_cached(sgf_path)
             filepath = sgf_path
         else:
             state, filepath = get_current_game()
@@ -284,17 +324,19 @@ def get_board_state(sgf_path: Optional[str] = None) -> str:
             lines.append(f"Result: {info['result']}")
         lines.append("")
         
+        # Sections append their lines directly, so the output is joined once
+        
         # Board
-        lines.append(board_to_ascii(state))
+        write_board_ascii(state, lines)
         lines.append("")
         
         # Explicit stone positions (LLM-friendly)
-        lines.append(format_stone_positions(state))
+        write_stone_positions(state, lines)
         lines.append("")
         
         # Recent moves
         lines.append("=== Recent Moves ===")
-        lines.append(format_move_history(state, last_n=10))
+        write_move_history(state, lines, last_n=10)
         
         return "\n".join(lines)
         
@@ -324,29 +366,31 @@ def analyze_position(
     """
     try:
         if sgf_path:
-            state = read_sgf_file(sgf_path)
+            state = read_sgf_file_cached(sgf_path)
         else:
             state, _ = get_current_game()
         
         client = get_katago_client()
-        result = client.analyze_position(
+        # Only rendered to text, so format straight from the JSON response
+        response = client.analyze_position_raw(
             state,
             max_visits=max_visits,
             include_ownership=INCLUDE_OWNERSHIP,
             analysis_pv_len=ANALYSIS_PV_LEN,
         )
         
-        if result is None:
+        if response is None:
             return "Error: KataGo analysis timed out or failed"
         
         # Format the analysis
         output = []
-        output.append(format_analysis_result(result, state, top_n=MAX_VARIATIONS))
+        output.append(format_analysis_result_from_raw(response, state, top_n=MAX_VARIATIONS))
         
         # Add territory map if available
-        if result.ownership and INCLUDE_OWNERSHIP:
+        ownership = response.get("ownership")
+        if ownership and INCLUDE_OWNERSHIP:
             output.append("")
-            output.append(format_ownership_map(result.ownership, state.board_size))
+            output.append(format_ownership_map(quantize_ownership(ownership), state.board_size))
         
         return "\n".join(output)
         
@@ -376,16 +420,18 @@ def get_move_recommendation(
     """
     try:
         if sgf_path:
-            state = read_sgf_file(sgf_path)
+            state = read_sgf_file_cached(sgf_path)
         else:
             state, _ = get_current_game()
         
         client = get_katago_client()
+        # Only the top moves and the first 6 moves of the best line are shown
         result = client.analyze_position(
             state,
             max_visits=ANALYSIS_VISITS,
-            include_ownership=True,
-            analysis_pv_len=ANALYSIS_PV_LEN,
+            include_ownership=False,
+            analysis_pv_len=min(ANALYSIS_PV_LEN, 6),
+            top_n=3,
         )
         
         if result is None:
@@ -471,7 +517,7 @@ def get_territory_analysis(sgf_path: Optional[str] = None) -> str:
     """
     try:
         if sgf_path:
-            state = read_sgf_file(sgf_path)
+            state = read_sgf_file_cached(sgf_path)
         else:
             state, _ = get_current_game()
         
@@ -548,15 +594,18 @@ def evaluate_move(
     """
     try:
         if sgf_path:
-            state = read_sgf_file(sgf_path)
+            state = read_sgf_file_cached(sgf_path)
         else:
             state, _ = get_current_game()
         
         client = get_katago_client()
+        # Only moves, win rates and scores are shown, so skip ownership and
+        # ask for the shortest principal variations
         result = client.analyze_position(
             state,
             max_visits=ANALYSIS_VISITS,
             include_ownership=False,
+            analysis_pv_len=1,
         )
         
         if result is None:
@@ -564,11 +613,13 @@ def evaluate_move(
         
         move_upper = move.upper().strip()
         
-        # Find the move in analysis
+        # Find the move in analysis, keeping its rank from the same scan
         found_move = None
-        for mi in result.move_infos:
+        found_rank = 0
+        for rank, mi in enumerate(result.move_infos, 1):
             if mi.move.upper() == move_upper:
                 found_move = mi
+                found_rank = rank
                 break
         
         best = result.move_infos[0] if result.move_infos else None
@@ -587,9 +638,8 @@ def evaluate_move(
             lines.append("")
         
         if found_move:
-            rank = result.move_infos.index(found_move) + 1
             lines.append(f"Your move {move_upper}:")
-            lines.append(f"  Rank: #{rank} out of {len(result.move_infos)} considered moves")
+            lines.append(f"  Rank: #{found_rank} out of {len(result.move_infos)} considered moves")
             lines.append(f"  Win rate: {found_move.winrate * 100:.1f}%")
             lines.append(f"  Score: {found_move.score_lead:+.1f}")
             
@@ -621,6 +671,123 @@ def evaluate_move(
         return f"Error evaluating move: {e}"
 
 
+@mcp.tool()
+def analyze_game(
+    sgf_path: Optional[str] = None,
+    every_n_moves: int = 1,
+    max_visits: int = ANALYSIS_VISITS,
+) -> str:
+    """
+    Review a whole game: win rate and score after every move, plus the biggest mistakes.
+    
+    All positions are sent to KataGo as a single query, which analyzes
+    them in parallel.
+    
+    Args:
+        sgf_path: Optional path to a specific SGF file
+        every_n_moves: Analyze every Nth position (1 = every move)
+        max_visits: Analysis depth per position (more visits = stronger, slower)
+        
+    Returns:
+        Move-by-move evaluation table and the largest win rate drops
+    """
+    try:
+        if sgf_path:
+            state = read_sgf_file_cached(sgf_path)
+            filepath = sgf_path
+        else:
+            state, filepath = get_current_game()
+        
+        every_n_moves = max(1, every_n_moves)
+        turns = list(range(0, len(state.moves) + 1, every_n_moves))
+        if turns[-1] != len(state.moves):
+            turns.append(len(state.moves))
+        
+        client = get_katago_client()
+        results = client.analyze_positions(
+            state,
+            turns,
+            max_visits=max_visits,
+            include_ownership=False,
+            analysis_pv_len=1,
+            top_n=1,
+        )
+        
+        if not results:
+            return "Error: Game analysis timed out or failed"
+        
+        # Black's win rate and score lead after each analyzed turn
+        black_eval = {}
+        for turn, result in results.items():
+            if result.current_player == "B":
+                black_eval[turn] = (result.root_winrate, result.root_score_lead)
+            else:
+                black_eval[turn] = (1 - result.root_winrate, -result.root_score_lead)
+        
+        lines = []
+        lines.append(f"=== Game Review: {os.path.basename(filepath)} ===")
+        lines.append(f"Analyzed {len(results)} positions ({max_visits} visits each)")
+        lines.append("")
+        lines.append("Move  Played       Black win%  Score (B)")
+        
+        for turn in sorted(results):
+            if turn == 0:
+                played = "(start)"
+            else:
+                color, coord = state.moves[turn - 1]
+                move_str = "pass" if coord is None else coord_to_gtp(coord[0], coord[1], state.board_size)
+                played = f"{color} {move_str}"
+            winrate, score = black_eval[turn]
+            lines.append(f"{turn:4d}  {played:<11s}  {winrate * 100:9.1f}%  {score:+9.1f}")
+        
+        # Mistakes need the evaluation right before and after a single move
+        mistakes = []
+        for turn in sorted(results):
+            if turn == 0 or turn - 1 not in results:
+                continue
+            color, coord = state.moves[turn - 1]
+            before, after = black_eval[turn - 1][0], black_eval[turn][0]
+            loss = before - after if color == "B" else after - before
+            if loss > 0:
+                mistakes.append((loss, turn))
+        
+        if mistakes:
+            mistakes.sort(reverse=True)
+            lines.append("")
+            lines.append("=== Biggest Mistakes ===")
+            for loss, turn in mistakes[:5]:
+                color, coord = state.moves[turn - 1]
+                player = "Black" if color == "B" else "White"
+                move_str = "pass" if coord is None else coord_to_gtp(coord[0], coord[1], state.board_size)
+                best = results[turn - 1].move_infos
+                best_str = f" (KataGo preferred {best[0].move})" if best else ""
+                lines.append(f"Move {turn}: {player} {move_str} lost {loss * 100:.1f}% win rate{best_str}")
+        
+        return "\n".join(lines)
+        
+    except FileNotFoundError as e:
+        return str(e)
+    except Exception as e:
+        return f"Error analyzing game: {e}"
+
+
+# Formatted modification times, keyed by mtime; the same files are listed
+# on every call, so most lookups hit
+_MTIME_FMT_CACHE: dict[float, str] = {}
+_MTIME_FMT_CACHE_MAX = 256
+
+
+def _format_mtime(mtime: float) -> str:
+    """Format a file modification time for display, memoized by mtime."""
+    text = _MTIME_FMT_CACHE.get(mtime)
+    if text is None:
+        if len(_MTIME_FMT_CACHE) >= _MTIME_FMT_CACHE_MAX:
+            _MTIME_FMT_CACHE.clear()
+        text = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+        _MTIME_FMT_CACHE[mtime] = text
+    return text
+
+
 @mcp.tool()
 def list_sgf_files() -> str:
     """
@@ -631,28 +798,23 @@ def list_sgf_files() -> str:
     Returns:
         List of SGF files with their paths
     """
-    import glob
-    
-    pattern = os.path.join(SGF_WATCH_PATH, "**", "*.sgf")
-    sgf_files = glob.glob(pattern, recursive=True)
+    # Already sorted by modification time, newest first
+    sgf_files = scan_sgf_files(SGF_WATCH_PATH)
     
     if not sgf_files:
         return f"No SGF files found in {SGF_WATCH_PATH}"
     
-    # Sort by modification time
-    sgf_files.sort(key=os.path.getmtime, reverse=True)
-    
     lines = []
     lines.append(f"=== SGF Files in {SGF_WATCH_PATH} ===")
     lines.append("")
     
-    for i, filepath in enumerate(sgf_files[:20], 1):  # Show max 20
-        mtime = os.path.getmtime(filepath)
-        from datetime import datetime
-        dt = datetime.fromtimestamp(mtime)
-        relative = os.path.relpath(filepath, SGF_WATCH_PATH)
+    # Every path starts with the watch directory, so strip it as a prefix
+    prefix_len = len(os.path.join(SGF_WATCH_PATH, ""))
+    
+    for i, (filepath, mtime) in enumerate(sgf_files[:20], 1):  # Show max 20
+        relative = filepath[prefix_len:]
         lines.append(f"{i}. {relative}")
-        lines.append(f"   Modified: {dt.strftime('%Y-%m-%d %H:%M')}")
+        lines.append(f"   Modified: {_format_mtime(mtime)}")
     
     if len(sgf_files) > 20:
         lines.append(f"\n... and {len(sgf_files) - 20} more files")
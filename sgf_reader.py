@@ -4,7 +4,12 @@ SGF Reader module for parsing Go game files.
 Uses sgfmill library for robust SGF parsing.
 """
 import os
-import glob
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 from typing import Optional, List, Tuple, Dict, Any
 from dataclasses import dataclass, field
@@ -38,6 +43,12 @@ class GameState:
             self.board = [[None for _ in range(self.board_size)] for _ in range(self.board_size)]
 
 
+# GTP column letters (no 'I') and their column indices, either case
+_GTP_COLUMNS = tuple("ABCDEFGHJKLMNOPQRST")
+_GTP_COL_TO_IDX = {letter: col for col, letter in enumerate(_GTP_COLUMNS)}
+_GTP_COL_TO_IDX.update({letter.lower(): col for letter, col in list(_GTP_COL_TO_IDX.items())})
+
+
 def coord_to_sgf(row: int, col: int, board_size: int = 19) -> str:
     """Convert board coordinates to SGF format."""
     return chr(ord('a') + col) + chr(ord('a') + row)
@@ -53,29 +64,118 @@ def sgf_to_coord(sgf_point: str) -> Tuple[int, int]:
 def coord_to_gtp(row: int, col: int, board_size: int = 19) -> str:
     """Convert board coordinates to GTP format (e.g., 'D4', 'Q16')."""
     # GTP uses letters A-T (excluding I) for columns, 1-19 for rows from bottom
-    letters = "ABCDEFGHJKLMNOPQRST"  # No 'I'
-    return f"{letters[col]}{board_size - row}"
+    return f"{_GTP_COLUMNS[col]}{board_size - row}"
+
+
+@lru_cache(maxsize=None)
+def gtp_table(board_size: int = 19) -> Tuple[Tuple[str, ...], ...]:
+    """
+    Get the GTP names of every point on the board, indexed as [row][col].
+    
+    Built once per board size so hot paths can replace repeated
+    coord_to_gtp() calls with a table lookup.
+    """
+    return tuple(
+        tuple(coord_to_gtp(row, col, board_size) for col in range(board_size))
+        for row in range(board_size)
+    )
 
 
 def gtp_to_coord(gtp_point: str, board_size: int = 19) -> Tuple[int, int]:
     """Convert GTP point to board coordinates (row, col)."""
-    letters = "ABCDEFGHJKLMNOPQRST"
-    col = letters.index(gtp_point[0].upper())
+    try:
+        col = _GTP_COL_TO_IDX[gtp_point[0]]
+    except KeyError:
+        raise ValueError(f"Invalid GTP column in {gtp_point!r}") from None
     row = board_size - int(gtp_point[1:])
     return (row, col)
 
 
-def find_latest_sgf(directory: str) -> Optional[str]:
-    """Find the most recently modified SGF file in a directory."""
-    pattern = os.path.join(directory, "**", "*.sgf")
-    sgf_files = glob.glob(pattern, recursive=True)
+# How long a directory scan by scan_sgf_files() is reused, in seconds
+_SGF_RESCAN_INTERVAL = 1.0
+
+# directory -> (directory mtime, scan time, [(path, mtime), ...] newest first)
+_sgf_index: Dict[str, Tuple[Optional[int], float, List[Tuple[str, float]]]] = {}
+
+
+def _walk_sgf_files(directory: str) -> List[Tuple[str, float]]:
+    """Walk directory with os.scandir and collect (path, mtime) of every SGF file."""
+    found = []
+    pending = [directory]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    # Hidden files and directories are skipped, like glob's **/*.sgf
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            pending.append(entry.path)
+                        elif entry.name.endswith(".sgf"):
+                            found.append((entry.path, entry.stat().st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return found
+
+
+def scan_sgf_files(directory: str) -> List[Tuple[str, float]]:
+    """
+    List the SGF files under a directory (recursively) with their mtimes.
     
-    if not sgf_files:
-        return None
+    A scan is reused for up to _SGF_RESCAN_INTERVAL seconds unless the
+    directory's own mtime changes (a file was added, removed or renamed at
+    its top level), so back-to-back tool calls don't walk the tree again.
+    The returned list is shared and must not be modified.
     
-    # Sort by modification time, most recent first
-    sgf_files.sort(key=os.path.getmtime, reverse=True)
-    return sgf_files[0]
+    Returns:
+        List of (path, mtime) tuples, most recently modified first
+    """
+    try:
+        dir_mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        dir_mtime = None
+    now = time.monotonic()
+    
+    cached = _sgf_index.get(directory)
+    if (
+        cached is not None
+        and dir_mtime is not None
+        and cached[0] == dir_mtime
+        and now - cached[1] < _SGF_RESCAN_INTERVAL
+    ):
+        return cached[2]
+    
+    files = _walk_sgf_files(directory)
+    files.sort(key=itemgetter(1), reverse=True)
+    _sgf_index[directory] = (dir_mtime, now, files)
+    return files
+
+
+def find_latest_sgf(directory: str) -> Optional[str]:
+    """Find the most recently modified SGF file in a directory."""
+    sgf_files = scan_sgf_files(directory)
+    return sgf_files[0][0] if sgf_files else None
+
+
+# sgfmill colours to our player/stone letters
+_COLORS = {'b': 'B', 'w': 'W'}
+
+
+def _get_property(node, identifier: str, default: Any) -> Any:
+    """Get an SGF property's value, or default if it is missing, empty or malformed."""
+    if not node.has_property(identifier):
+        return default
+    try:
+        return node.get(identifier) or default
+    except ValueError:
+        return default
+
+
+# Files at least this large are memory-mapped instead of read by read_sgf_file()
+_SGF_MMAP_THRESHOLD = 64 * 1024
 
 
 def read_sgf_file(filepath: str) -> GameState:
@@ -89,7 +189,14 @@ def read_sgf_file(filepath: str) -> GameState:
         GameState object with the current position
     """
     with open(filepath, 'rb') as f:
-        game = sgf.Sgf_game.from_bytes(f.read())
+        if os.fstat(f.fileno()).st_size < _SGF_MMAP_THRESHOLD:
+            game = sgf.Sgf_game.from_bytes(f.read())
+        else:
+            # sgfmill accepts any bytes-like object and stops after the first
+            # game, so a large collection is parsed straight from the page
+            # cache without copying the whole file into memory
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                game = sgf.Sgf_game.from_bytes(data)
     
     root = game.get_root()
     
@@ -104,32 +211,14 @@ def read_sgf_file(filepath: str) -> GameState:
         pass
     
     # Get player names
-    black_player = "Black"
-    white_player = "White"
-    try:
-        black_player = root.get("PB") or "Black"
-    except Exception:
-        pass
-    try:
-        white_player = root.get("PW") or "White"
-    except Exception:
-        pass
+    black_player = _get_property(root, "PB", "Black")
+    white_player = _get_property(root, "PW", "White")
     
     # Get result if available
-    result = ""
-    try:
-        result = root.get("RE") or ""
-    except Exception:
-        pass
+    result = _get_property(root, "RE", "")
     
     # Get rules
-    rules = "chinese"
-    try:
-        ru = root.get("RU")
-        if ru:
-            rules = ru.lower()
-    except Exception:
-        pass
+    rules = _get_property(root, "RU", "chinese").lower()
     
     # Initialize game state
     state = GameState(
@@ -163,6 +252,12 @@ def read_sgf_file(filepath: str) -> GameState:
     except Exception:
         pass
     
+    # IMPORTANT: sgfmill uses row 0 = BOTTOM of board (Go row 1)
+    # But our internal array uses row 0 = TOP (Go row 19)
+    # So we need to flip: sgfmill row R becomes internal row (board_size - 1 - R)
+    # The flip is computed once and shared by the move list and the board
+    internal_rows = range(board_size - 1, -1, -1)
+    
     # Walk through the main line and collect moves
     moves = []
     main_sequence = game.get_main_sequence()
@@ -179,12 +274,10 @@ def read_sgf_file(filepath: str) -> GameState:
                     pass  # Illegal move in SGF, skip
                 
                 # Convert to our internal coordinate system (row 0 = top)
-                # sgfmill uses row 0 = bottom, so invert
-                internal_row = board_size - 1 - sgfmill_row
-                moves.append((color.upper(), (internal_row, col)))
+                moves.append((_COLORS[color], (internal_rows[sgfmill_row], col)))
             else:
                 # Pass
-                moves.append((color.upper(), None))
+                moves.append((_COLORS[color], None))
     
     state.moves = moves
     
@@ -195,21 +288,52 @@ def read_sgf_file(filepath: str) -> GameState:
     else:
         state.current_player = "B"
     
-    # Convert board state
-    # IMPORTANT: sgfmill uses row 0 = BOTTOM of board (Go row 1)
-    # But our internal array uses row 0 = TOP (Go row 19)
-    # So we need to flip: sgfmill row R becomes internal row (board_size - 1 - R)
-    for sgfmill_row in range(board_size):
-        for col in range(board_size):
-            stone = board.get(sgfmill_row, col)
-            # Invert row: sgfmill's bottom (row 0) becomes our top row in array
-            internal_row = board_size - 1 - sgfmill_row
-            if stone == 'b':
-                state.board[internal_row][col] = 'B'
-            elif stone == 'w':
-                state.board[internal_row][col] = 'W'
-            else:
-                state.board[internal_row][col] = None
+    # Convert board state, flipped like the moves
+    # state.board starts out empty, so only the occupied points need copying
+    internal_board = state.board
+    for stone, (sgfmill_row, col) in board.list_occupied_points():
+        internal_board[internal_rows[sgfmill_row]][col] = _COLORS[stone]
+    
+    return state
+
+
+# Parsed games for read_sgf_file_cached(): path -> (mtime, size, state),
+# least recently used first
+_SGF_CACHE_SIZE = 64
+_sgf_cache: "OrderedDict[str, Tuple[int, int, GameState]]" = OrderedDict()
+_sgf_cache_lock = threading.Lock()
+
+
+def read_sgf_file_cached(filepath: str) -> GameState:
+    """
+    Read an SGF file, reusing the parsed game while the file is unchanged.
+    
+    Games are keyed by path, modification time and size, so a file is only
+    parsed again after it has been saved. The returned GameState is shared
+    with later callers and must not be modified.
+    
+    Args:
+        filepath: Path to the SGF file
+        
+    Returns:
+        GameState object with the current position
+    """
+    path = os.path.abspath(filepath)
+    st = os.stat(path)
+    
+    with _sgf_cache_lock:
+        cached = _sgf_cache.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            _sgf_cache.move_to_end(path)
+            return cached[2]
+    
+    state = read_sgf_file(path)
+    
+    with _sgf_cache_lock:
+        _sgf_cache[path] = (st.st_mtime_ns, st.st_size, state)
+        _sgf_cache.move_to_end(path)
+        while len(_sgf_cache) > _SGF_CACHE_SIZE:
+            _sgf_cache.popitem(last=False)
     
     return state
 
@@ -220,44 +344,66 @@ def board_to_ascii(state: GameState) -> str:
     
     Returns a string with the board, suitable for display.
     """
+    lines = []
+    write_board_ascii(state, lines)
+    return "\n".join(lines)
+
+
+def write_board_ascii(state: GameState, lines: List[str]) -> None:
+    """
+    Append the lines of board_to_ascii() to lines.
+    
+    Lets callers assembling a larger output join everything once.
+    """
     size = state.board_size
-    letters = "ABCDEFGHJKLMNOPQRST"[:size]  # No 'I' in Go
+    header = _board_header(size)
     
-    lines = []
-    lines.append(f"   {' '.join(letters)}")
+    lines.append(header)
     
-    for row in range(size):
+    # Stones drawn over the empty board, which has the star points marked
+    empty_rows = _empty_board_rows(size)
+    for row, (board_row, empty_row) in enumerate(zip(state.board, empty_rows)):
         row_num = size - row
-        row_str = f"{row_num:2d} "
-        for col in range(size):
-            stone = state.board[row][col]
-            if stone == 'B':
-                row_str += "X "
-            elif stone == 'W':
-                row_str += "O "
-            else:
-                # Mark star points
-                if is_star_point(row, col, size):
-                    row_str += "+ "
-                else:
-                    row_str += ". "
-        row_str += f"{row_num:2d}"
-        lines.append(row_str)
+        cells = " ".join(
+            _STONE_CHARS.get(stone) or empty
+            for stone, empty in zip(board_row, empty_row)
+        )
+        lines.append(f"{row_num:2d} {cells} {row_num:2d}")
     
-    lines.append(f"   {' '.join(letters)}")
-    
-    return "\n".join(lines)
+    lines.append(header)
+
+
+# ASCII characters for stones in board_to_ascii()
+_STONE_CHARS = {'B': "X", 'W': "O"}
+
+# Rows/columns holding the star points, per board size
+_STAR_POINT_LINES = {
+    19: frozenset((3, 9, 15)),
+    13: frozenset((3, 6, 9)),
+    9: frozenset((2, 4, 6)),
+}
+
+
+@lru_cache(maxsize=None)
+def _board_header(size: int) -> str:
+    """Get the column letter line above and below an ASCII board."""
+    letters = "ABCDEFGHJKLMNOPQRST"[:size]  # No 'I' in Go
+    return f"   {' '.join(letters)}"
+
+
+@lru_cache(maxsize=None)
+def _empty_board_rows(size: int) -> Tuple[Tuple[str, ...], ...]:
+    """Get the ASCII cells of an empty board, with star points marked."""
+    return tuple(
+        tuple("+" if is_star_point(row, col, size) else "." for col in range(size))
+        for row in range(size)
+    )
 
 
 def is_star_point(row: int, col: int, size: int) -> bool:
     """Check if a position is a star point (hoshi)."""
-    if size == 19:
-        star_positions = [3, 9, 15]
-    elif size == 13:
-        star_positions = [3, 6, 9]
-    elif size == 9:
-        star_positions = [2, 4, 6]
-    else:
+    star_positions = _STAR_POINT_LINES.get(size)
+    if star_positions is None:
         return False
     
     return row in star_positions and col in star_positions
@@ -265,22 +411,53 @@ def is_star_point(row: int, col: int, size: int) -> bool:
 
 def format_move_history(state: GameState, last_n: int = 10) -> str:
     """Format the last N moves as a readable string."""
+    lines = []
+    write_move_history(state, lines, last_n=last_n)
+    return "\n".join(lines)
+
+
+def write_move_history(state: GameState, lines: List[str], last_n: int = 10) -> None:
+    """Append the lines of format_move_history() to lines."""
     if not state.moves:
-        return "No moves played yet."
+        lines.append("No moves played yet.")
+        return
     
     recent_moves = state.moves[-last_n:]
     start_num = len(state.moves) - len(recent_moves) + 1
+    table = gtp_table(state.board_size)
     
-    lines = []
     for i, (color, coord) in enumerate(recent_moves, start=start_num):
         if coord is None:
             move_str = "pass"
         else:
-            move_str = coord_to_gtp(coord[0], coord[1], state.board_size)
+            move_str = table[coord[0]][coord[1]]
         player = "Black" if color == "B" else "White"
         lines.append(f"{i}. {player}: {move_str}")
+
+
+def list_stones(state: GameState) -> Tuple[List[str], List[str]]:
+    """
+    List the GTP coordinates of all black and white stones, in board order.
     
-    return "\n".join(lines)
+    Each board row is paired with its row of precomputed GTP names, and
+    rows without a stone of a color are skipped with a single C-level
+    membership test.
+    
+    Returns:
+        Tuple of (black stones, white stones)
+    """
+    table = gtp_table(state.board_size)
+    black_stones = [
+        name
+        for board_row, names in zip(state.board, table) if 'B' in board_row
+        for stone, name in zip(board_row, names) if stone == 'B'
+    ]
+    white_stones = [
+        name
+        for board_row, names in zip(state.board, table) if 'W' in board_row
+        for stone, name in zip(board_row, names) if stone == 'W'
+    ]
+    return black_stones, white_stones
 
 
 def format_stone_positions(state: GameState) -> str:
@@ -290,19 +467,7 @@ def format_stone_positions(state: GameState) -> str:
     Returns:
         String listing all stones grouped by color with coordinates
     """
-    black_stones = []
-    white_stones = []
-    
-    # Collect all stone positions
-    for row in range(state.board_size):
-        for col in range(state.board_size):
-            stone = state.board[row][col]
-            if stone == 'B':
-                coord = coord_to_gtp(row, col, state.board_size)
-                black_stones.append(coord)
-            elif stone == 'W':
-                coord = coord_to_gtp(row, col, state.board_size)
-                white_stones.append(coord)
+    black_stones, white_stones = list_stones(state)
     
     # Sort stones for consistent output
     black_stones.sort()
@@ -316,9 +481,10 @@ def format_stone_positions(state: GameState) -> str:
     if black_stones:
         lines.append(f"BLACK STONES (X): {len(black_stones)} stones")
         # Group in lines of 10 for readability
-        for i in range(0, len(black_stones), 10):
-            group = black_stones[i:i+10]
-            lines.append(f"  {', '.join(group)}")
+        lines.extend(
+            f"  {', '.join(black_stones[i:i + 10])}"
+            for i in range(0, len(black_stones), 10)
+        )
     else:
         lines.append("BLACK STONES (X): None")
     
@@ -327,9 +493,10 @@ def format_stone_positions(state: GameState) -> str:
     # White stones
     if white_stones:
         lines.append(f"WHITE STONES (O): {len(white_stones)} stones")
-        for i in range(0, len(white_stones), 10):
-            group = white_stones[i:i+10]
-            lines.append(f"  {', '.join(group)}")
+        lines.extend(
+            f"  {', '.join(white_stones[i:i + 10])}"
+            for i in range(0, len(white_stones), 10)
+        )
     else:
         lines.append("WHITE STONES (O): None")
     
@@ -7,17 +7,42 @@ This script tests each tool individually with detailed logging.
 import os
 import sys
 import json
+import atexit
+import logging
+import textwrap
+import traceback
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from typing import Callable, Optional
+from unittest import SkipTest
 
 # Set up test environment
 TEST_SGF_PATH = os.environ.get('SGF_WATCH_PATH', '/home/sandbox/katago-mcp/test_games')
 os.environ['SGF_WATCH_PATH'] = TEST_SGF_PATH
 
+# Project modules come after the environment setup: config reads
+# SGF_WATCH_PATH when it is first imported
+from config import KATAGO_PATH, KATAGO_MODEL, KATAGO_CONFIG
+from sgf_reader import (
+    find_latest_sgf,
+    scan_sgf_files,
+    read_sgf_file_cached,
+    board_to_ascii,
+    format_move_history,
+    get_game_info,
+)
+from katago_client import (
+    KataGoClient,
+    OWNERSHIP_SCALE,
+    format_analysis_result,
+    format_ownership_map,
+)
+
 def log_section(title: str):
     """Print a section header."""
-    print("\n" + "=" * 70)
-    print(f" {title}")
-    print("=" * 70)
+    rule = "=" * 70
+    print(f"\n{rule}\n {title}\n{rule}")
 
 def log_step(step: str):
     """Print a step within a test."""
@@ -35,114 +60,166 @@ def log_warning(message: str):
     """Print a warning message."""
     print(f"  ⚠ {message}")
 
+# Stack traces go through their own logger, so CI can silence them with
+# LOGLEVEL=CRITICAL. It writes to stdout to keep them next to the failing
+# test and doesn't propagate, so library loggers stay untouched.
+logger = logging.getLogger("katago_mcp.tests")
+_log_level = os.environ.get("LOGLEVEL", "INFO").upper()
+_valid_log_level = isinstance(logging.getLevelName(_log_level), int)
+logger.setLevel(_log_level if _valid_log_level else "INFO")
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_log_handler)
+logger.propagate = False
+if not _valid_log_level:
+    logger.warning("  ⚠ Unknown LOGLEVEL %r, using INFO", _log_level)
+
+def log_traceback():
+    """Log the stack trace of the exception being handled, indented."""
+    logger.error("\n  Stack trace:\n%s", textwrap.indent(traceback.format_exc(), "    "))
+
 def log_data(label: str, data: str, max_lines: int = 10):
     """Print data with a label, truncated if too long."""
-    print(f"\n  📄 {label}:")
     lines = data.split('\n')
-    for i, line in enumerate(lines[:max_lines]):
-        print(f"    {line}")
+    out = [f"\n  📄 {label}:"]
+    out.extend(f"    {line}" for line in lines[:max_lines])
     if len(lines) > max_lines:
-        print(f"    ... ({len(lines) - max_lines} more lines)")
+        out.append(f"    ... ({len(lines) - max_lines} more lines)")
+    print("\n".join(out))
 
 
-# Main test execution
-print("=" * 70)
-print(f" KataGo MCP Server - Comprehensive Tool Testing")
-print(f" Test started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print("=" * 70)
+# ============================================================================
+# Test runner
+# ============================================================================
 
+# Outcome of each test by name: 'PASS', 'FAIL' or 'SKIP'
 test_results = {}
 
+# Shared between tests: the game loaded by test 2, and the KataGo client
+# and analysis from test 3. One search at test 3's settings covers
+# everything tests 4-6 look at, so they don't re-parse or re-query KataGo
+state = None
+client: Optional[KataGoClient] = None
+client_startup: Optional[Future] = None
+analysis = None
+
+
+def start_client_in_background() -> None:
+    """
+    Create the shared KataGo client and start it on a worker thread.
+    
+    Loading KataGo's network takes seconds, so the engine boots while
+    tests 1-2 run and test 3 waits for it. Missing files are left for
+    test 3 to report.
+    """
+    global client, client_startup
+    
+    if not (os.path.exists(KATAGO_PATH) and os.path.exists(KATAGO_MODEL)):
+        return
+    
+    client = KataGoClient(
+        katago_path=KATAGO_PATH,
+        model_path=KATAGO_MODEL,
+        config_path=KATAGO_CONFIG,
+    )
+    # Reaped on exit even if a test blows up
+    atexit.register(client.stop)
+    startup_executor = ThreadPoolExecutor(max_workers=1)
+    client_startup = startup_executor.submit(client.start)
+    startup_executor.shutdown(wait=False)
+
+
+def run_test(number: int, name: str, test: Callable[[], bool], requires: Optional[str] = None) -> None:
+    """
+    Run one test and record its outcome in test_results.
+    
+    A test returns True to pass and False to fail (after logging why), and
+    raises SkipTest when the environment can't run it. Any other exception
+    is a failure and its stack trace is logged. If requires names another
+    test, this one is skipped unless that test passed.
+    """
+    log_section(f"Test {number}: {name}")
+    
+    if requires is not None and test_results.get(requires) != 'PASS':
+        log_warning(f"Skipping (requires passing {requires} test)")
+        test_results[name] = 'SKIP'
+        return
+    
+    try:
+        test_results[name] = 'PASS' if test() else 'FAIL'
+    except SkipTest:
+        test_results[name] = 'SKIP'
+    except Exception as e:
+        log_error(f"Failed: {type(e).__name__}: {e}")
+        test_results[name] = 'FAIL'
+        log_traceback()
+
+
 # ============================================================================
 # Test 1: list_sgf_files
 # ============================================================================
 
-log_section("Test 1: list_sgf_files")
-
-try:
+def check_list_sgf_files() -> bool:
     log_step("Importing server module")
     from server import get_current_game
-    from sgf_reader import find_latest_sgf
     log_success("Server module imported")
     
     log_step(f"Scanning directory: {TEST_SGF_PATH}")
-    sgf_files = []
-    import glob
-    pattern = os.path.join(TEST_SGF_PATH, "**", "*.sgf")
-    sgf_files = glob.glob(pattern, recursive=True)
-    
-    if sgf_files:
-        log_success(f"Found {len(sgf_files)} SGF file(s)")
-        for sgf_file in sgf_files:
-            print(f"    - {os.path.basename(sgf_file)}")
-        test_results['list_sgf_files'] = 'PASS'
-    else:
+    # Same cached index the server uses; find_latest_sgf below reuses this scan
+    sgf_files = scan_sgf_files(TEST_SGF_PATH)
+    
+    if not sgf_files:
         log_warning(f"No SGF files found in {TEST_SGF_PATH}")
-        test_results['list_sgf_files'] = 'SKIP'
-        
-except Exception as e:
-    log_error(f"Failed: {type(e).__name__}: {e}")
-    test_results['list_sgf_files'] = 'FAIL'
-    import traceback
-    print("\n  Stack trace:")
-    for line in traceback.format_exc().split('\n'):
-        print(f"    {line}")
+        raise SkipTest("no SGF files")
+    
+    log_success(f"Found {len(sgf_files)} SGF file(s)")
+    for sgf_file, _ in sgf_files:
+        print(f"    - {os.path.basename(sgf_file)}")
+    return True
 
 # ============================================================================
 # Test 2: get_board_state
 # ============================================================================
 
-log_section("Test 2: get_board_state")
-
-try:
-    from sgf_reader import read_sgf_file, board_to_ascii, format_move_history, get_game_info
+def check_get_board_state() -> bool:
+    global state
     
     log_step("Finding latest SGF file")
     sgf_path = find_latest_sgf(TEST_SGF_PATH)
     
     if not sgf_path:
         log_error("No SGF file found")
-        test_results['get_board_state'] = 'SKIP'
-    else:
-        log_success(f"Using: {os.path.basename(sgf_path)}")
-        
-        log_step("Reading SGF file")
-        state = read_sgf_file(sgf_path)
-        log_success("SGF parsed successfully")
-        
-        log_step("Extracting game information")
-        info = get_game_info(state)
-        log_data("Game Info", json.dumps(info, indent=2))
-        
-        log_step("Generating board display")
-        board_ascii = board_to_ascii(state)
-        log_data("Board State", board_ascii, max_lines=15)
-        
-        log_step("Formatting move history")
-        move_history = format_move_history(state, last_n=10)
-        log_data("Recent Moves", move_history)
-        
-        log_success("get_board_state functionality verified")
-        test_results['get_board_state'] = 'PASS'
-        
-except Exception as e:
-    log_error(f"Failed: {type(e).__name__}: {e}")
-    test_results['get_board_state'] = 'FAIL'
-    import traceback
-    print("\n  Stack trace:")
-    for line in traceback.format_exc().split('\n'):
-        print(f"    {line}")
+        raise SkipTest("no SGF file")
+    
+    log_success(f"Using: {os.path.basename(sgf_path)}")
+    
+    log_step("Reading SGF file")
+    state = read_sgf_file_cached(sgf_path)
+    log_success("SGF parsed successfully")
+    
+    log_step("Extracting game information")
+    info = get_game_info(state)
+    log_data("Game Info", json.dumps(info, indent=2))
+    
+    log_step("Generating board display")
+    board_ascii = board_to_ascii(state)
+    log_data("Board State", board_ascii, max_lines=15)
+    
+    log_step("Formatting move history")
+    move_history = format_move_history(state, last_n=10)
+    log_data("Recent Moves", move_history)
+    
+    log_success("get_board_state functionality verified")
+    return True
 
 # ============================================================================
 # Test 3: analyze_position (requires working KataGo)
 # ============================================================================
 
-log_section("Test 3: analyze_position")
-log_warning("This test requires a working KataGo installation")
-
-try:
-    from katago_client import KataGoClient, format_analysis_result
-    from config import KATAGO_PATH, KATAGO_MODEL, KATAGO_CONFIG
+def check_analyze_position() -> bool:
+    global state, analysis
+    
+    log_warning("This test requires a working KataGo installation")
     
     log_step("Checking KataGo configuration")
     print(f"    KataGo path: {KATAGO_PATH}")
@@ -151,304 +228,313 @@ try:
     
     if not os.path.exists(KATAGO_PATH):
         log_error(f"KataGo not found at {KATAGO_PATH}")
-        test_results['analyze_position'] = 'SKIP'
-    elif not os.path.exists(KATAGO_MODEL):
+        raise SkipTest("KataGo not found")
+    if not os.path.exists(KATAGO_MODEL):
         log_error(f"Model not found at {KATAGO_MODEL}")
-        test_results['analyze_position'] = 'SKIP'
-    else:
-        log_success("KataGo and model files exist")
-        
-        log_step("Creating KataGo client with debug enabled")
-        client = KataGoClient(
-            katago_path=KATAGO_PATH,
-            model_path=KATAGO_MODEL,
-            config_path=KATAGO_CONFIG,
-            debug=True  # Enable debug logging
-        )
-        log_success("Client created")
-        
-        log_step("Starting KataGo process")
-        client.start()
-        log_success("KataGo process started")
-        
-        log_step("Loading game state")
-        sgf_path = find_latest_sgf(TEST_SGF_PATH)
-        state = read_sgf_file(sgf_path)
-        log_success(f"Loaded position with {len(state.moves)} moves")
-        
-        log_step("Sending analysis query (maxVisits=10)")
-        print("    (Watch for debug output in stderr)")
-        
-        result = client.analyze_position(
-            state,
-            max_visits=10,
-            include_ownership=True,
-            analysis_pv_len=10
-        )
-        
-        if result:
-            log_success("Analysis completed successfully!")
-            
-            # Show analysis results
-            analysis_text = format_analysis_result(result, state, top_n=3)
-            log_data("Analysis Result", analysis_text, max_lines=20)
-            
-            # Show raw response summary
-            print(f"\n  📊 Analysis metrics:")
-            print(f"    - Request ID: {result.id}")
-            print(f"    - Root visits: {result.root_visits}")
-            print(f"    - Move candidates: {len(result.move_infos)}")
-            print(f"    - Ownership data: {'Yes' if result.ownership else 'No'}")
-            
-            test_results['analyze_position'] = 'PASS'
-        else:
-            log_error("Analysis returned None (timeout or communication error)")
-            log_warning("Check debug output above for KataGo communication issues")
-            test_results['analyze_position'] = 'FAIL'
-        
-        log_step("Stopping KataGo client")
-        client.stop()
-        log_success("Client stopped")
-        
-except FileNotFoundError as e:
-    log_error(f"Configuration error: {e}")
-    test_results['analyze_position'] = 'SKIP'
-except Exception as e:
-    log_error(f"Failed: {type(e).__name__}: {e}")
-    test_results['analyze_position'] = 'FAIL'
-    import traceback
-    print("\n  Stack trace:")
-    for line in traceback.format_exc().split('\n'):
-        print(f"    {line}")
+        raise SkipTest("model not found")
+    
+    log_success("KataGo and model files exist")
+    
+    log_step("Waiting for KataGo process (started before test 1)")
+    try:
+        client_startup.result()
+    except FileNotFoundError as e:
+        log_error(f"Configuration error: {e}")
+        raise SkipTest(str(e))
+    # The engine was started on a pool thread that has since exited; it
+    # must still be the same process when the query is answered
+    katago_pid = client.process.pid
+    log_success(f"KataGo process started (pid {katago_pid})")
+    
+    # Debug logging from here on, so the startup output doesn't
+    # interleave with tests 1-2
+    client.debug = True
+    
+    log_step("Loading game state")
+    if state is None:
+        state = read_sgf_file_cached(find_latest_sgf(TEST_SGF_PATH))
+    log_success(f"Loaded position with {len(state.moves)} moves")
+    
+    log_step("Sending analysis query (maxVisits=20)")
+    print("    (Watch for debug output in stderr)")
+    
+    # Ownership is always requested: test 5 reads it from this same
+    # result, so no later query has to be issued with different flags
+    result = client.analyze_position(
+        state,
+        max_visits=20,
+        include_ownership=True,
+        analysis_pv_len=10
+    )
+    
+    if not result:
+        log_error("Analysis returned None (timeout or communication error)")
+        log_warning("Check debug output above for KataGo communication issues")
+        return False
+    
+    log_success("Analysis completed successfully!")
+    
+    if client.process is None or client.process.pid != katago_pid:
+        log_error("KataGo was restarted after the background startup")
+        return False
+    
+    # Show analysis results
+    analysis_text = format_analysis_result(result, state, top_n=3)
+    log_data("Analysis Result", analysis_text, max_lines=20)
+    
+    # Show raw response summary
+    print(f"\n  📊 Analysis metrics:")
+    print(f"    - Request ID: {result.id}")
+    print(f"    - Root visits: {result.root_visits}")
+    print(f"    - Move candidates: {len(result.move_infos)}")
+    print(f"    - Ownership data: {'Yes' if result.ownership else 'No'}")
+    
+    analysis = result
+    return True
 
 # ============================================================================
 # Test 4: get_move_recommendation
 # ============================================================================
 
-log_section("Test 4: get_move_recommendation")
-log_warning("This test requires a working KataGo installation")
-
-try:
-    if test_results.get('analyze_position') == 'PASS':
-        log_step("Using KataGo client from previous test")
-        
-        client = KataGoClient(
-            katago_path=KATAGO_PATH,
-            model_path=KATAGO_MODEL,
-            config_path=KATAGO_CONFIG,
-            debug=False  # Less verbose for this test
-        )
-        client.start()
-        
-        state = read_sgf_file(find_latest_sgf(TEST_SGF_PATH))
-        
-        log_step("Requesting move recommendation")
-        result = client.analyze_position(state, max_visits=20)
-        
-        if result and result.move_infos:
-            best = result.move_infos[0]
-            
-            print(f"\n  📍 Recommendation details:")
-            print(f"    Best move: {best.move}")
-            print(f"    Win rate: {best.winrate * 100:.1f}%")
-            print(f"    Score: {best.score_lead:+.1f}")
-            print(f"    Visits: {best.visits}")
-            if best.pv:
-                print(f"    PV: {' '.join(best.pv[:5])}")
-            
-            # Show alternatives
-            if len(result.move_infos) > 1:
-                print(f"\n  Alternative moves:")
-                for i, mi in enumerate(result.move_infos[1:4], 2):
-                    wr_diff = (mi.winrate - best.winrate) * 100
-                    print(f"    {i}. {mi.move} (WR: {mi.winrate*100:.1f}%, {wr_diff:+.1f}%)")
-            
-            log_success("Move recommendation generated")
-            test_results['get_move_recommendation'] = 'PASS'
-        else:
-            log_error("No move recommendations available")
-            test_results['get_move_recommendation'] = 'FAIL'
-        
-        client.stop()
-        
-    else:
-        log_warning("Skipping (requires passing analyze_position test)")
-        test_results['get_move_recommendation'] = 'SKIP'
-        
-except Exception as e:
-    log_error(f"Failed: {type(e).__name__}: {e}")
-    test_results['get_move_recommendation'] = 'FAIL'
-    import traceback
-    print("\n  Stack trace:")
-    for line in traceback.format_exc().split('\n'):
-        print(f"    {line}")
+def check_get_move_recommendation() -> bool:
+    log_warning("This test requires a working KataGo installation")
+    
+    log_step("Using analysis from previous test")
+    result = analysis
+    
+    if not result.move_infos:
+        log_error("No move recommendations available")
+        return False
+    
+    best = result.move_infos[0]
+    
+    print(f"\n  📍 Recommendation details:")
+    print(f"    Best move: {best.move}")
+    print(f"    Win rate: {best.winrate * 100:.1f}%")
+    print(f"    Score: {best.score_lead:+.1f}")
+    print(f"    Visits: {best.visits}")
+    if best.pv:
+        print(f"    PV: {' '.join(best.pv[:5])}")
+    
+    # Show alternatives
+    if len(result.move_infos) > 1:
+        print(f"\n  Alternative moves:")
+        for i, mi in enumerate(result.move_infos[1:4], 2):
+            wr_diff = (mi.winrate - best.winrate) * 100
+            print(f"    {i}. {mi.move} (WR: {mi.winrate*100:.1f}%, {wr_diff:+.1f}%)")
+    
+    log_success("Move recommendation generated")
+    return True
 
 # ============================================================================
 # Test 5: get_territory_analysis
 # ============================================================================
 
-log_section("Test 5: get_territory_analysis")
-
-try:
-    if test_results.get('analyze_position') == 'PASS':
-        log_step("Testing territory analysis")
-        
-        client = KataGoClient(
-            katago_path=KATAGO_PATH,
-            model_path=KATAGO_MODEL,
-            config_path=KATAGO_CONFIG,
-            debug=False
-        )
-        client.start()
-        
-        state = read_sgf_file(find_latest_sgf(TEST_SGF_PATH))
-        
-        result = client.analyze_position(state, max_visits=20, include_ownership=True)
-        
-        if result and result.ownership:
-            from katago_client import format_ownership_map
-            
-            print(f"\n  Territory statistics:")
-            ownership = result.ownership
-            black_territory = sum(1 for o in ownership if o > 0.5)
-            white_territory = sum(1 for o in ownership if o < -0.5)
-            neutral = len(ownership) - black_territory - white_territory
-            
-            print(f"    Black territory: ~{black_territory} points")
-            print(f"    White territory: ~{white_territory} points")
-            print(f"    Neutral/contested: ~{neutral} points")
-            
-            territory_map = format_ownership_map(ownership, state.board_size)
-            log_data("Territory Map", territory_map, max_lines=15)
-            
-            log_success("Territory analysis completed")
-            test_results['get_territory_analysis'] = 'PASS'
-        else:
-            log_error("No ownership data returned")
-            test_results['get_territory_analysis'] = 'FAIL'
-        
-        client.stop()
-    else:
-        log_warning("Skipping (requires passing analyze_position test)")
-        test_results['get_territory_analysis'] = 'SKIP'
-        
-except Exception as e:
-    log_error(f"Failed: {type(e).__name__}: {e}")
-    test_results['get_territory_analysis'] = 'FAIL'
-    import traceback
-    print("\n  Stack trace:")
-    for line in traceback.format_exc().split('\n'):
-        print(f"    {line}")
+def check_get_territory_analysis() -> bool:
+    log_step("Testing territory analysis")
+    result = analysis
+    
+    if not result.ownership:
+        log_error("No ownership data returned")
+        return False
+    
+    print(f"\n  Territory statistics:")
+    ownership = result.ownership
+    # Ownership is int8-quantized, so the 0.5 cut-off is scaled to match
+    threshold = 0.5 * OWNERSHIP_SCALE
+    black_territory = white_territory = 0
+    for o in ownership:
+        if o > threshold:
+            black_territory += 1
+        elif o < -threshold:
+            white_territory += 1
+    neutral = len(ownership) - black_territory - white_territory
+    
+    print(f"    Black territory: ~{black_territory} points")
+    print(f"    White territory: ~{white_territory} points")
+    print(f"    Neutral/contested: ~{neutral} points")
+    
+    territory_map = format_ownership_map(ownership, state.board_size)
+    log_data("Territory Map", territory_map, max_lines=15)
+    
+    log_success("Territory analysis completed")
+    return True
 
 # ============================================================================
 # Test 6: evaluate_move
 # ============================================================================
 
-log_section("Test 6: evaluate_move")
-
-try:
-    if test_results.get('analyze_position') == 'PASS':
-        log_step("Testing move evaluation")
-        
-        client = KataGoClient(
-            katago_path=KATAGO_PATH,
-            model_path=KATAGO_MODEL,
-            config_path=KATAGO_CONFIG,
-            debug=False
-        )
-        client.start()
-        
-        state = read_sgf_file(find_latest_sgf(TEST_SGF_PATH))
-        
-        # Test with the best move from previous analysis
-        log_step("Getting analysis for move evaluation")
-        result = client.analyze_position(state, max_visits=20)
-        
-        if result and result.move_infos:
-            # Test evaluating the best move
-            best_move = result.move_infos[0].move
-            log_step(f"Evaluating move: {best_move}")
-            
-            # Find this move in the results
-            move_found = False
-            for mi in result.move_infos:
-                if mi.move == best_move:
-                    rank = result.move_infos.index(mi) + 1
-                    print(f"\n  📊 Move evaluation:")
-                    print(f"    Move: {mi.move}")
-                    print(f"    Rank: #{rank} of {len(result.move_infos)}")
-                    print(f"    Win rate: {mi.winrate * 100:.1f}%")
-                    print(f"    Score: {mi.score_lead:+.1f}")
-                    print(f"    Visits: {mi.visits}")
-                    move_found = True
-                    break
-            
-            # Also test a potentially bad move
-            if len(result.move_infos) > 3:
-                log_step("Testing evaluation of a suboptimal move")
-                suboptimal = result.move_infos[3].move
-                wr_diff = (result.move_infos[3].winrate - result.move_infos[0].winrate) * 100
-                print(f"    Move: {suboptimal}")
-                print(f"    Win rate difference: {wr_diff:+.1f}% vs best")
-            
-            if move_found:
-                log_success("Move evaluation completed")
-                test_results['evaluate_move'] = 'PASS'
-            else:
-                log_error("Move not found in analysis")
-                test_results['evaluate_move'] = 'FAIL'
-        else:
-            log_error("No analysis data available")
-            test_results['evaluate_move'] = 'FAIL'
-        
-        client.stop()
-    else:
-        log_warning("Skipping (requires passing analyze_position test)")
-        test_results['evaluate_move'] = 'SKIP'
-        
-except Exception as e:
-    log_error(f"Failed: {type(e).__name__}: {e}")
-    test_results['evaluate_move'] = 'FAIL'
-    import traceback
-    print("\n  Stack trace:")
-    for line in traceback.format_exc().split('\n'):
-        print(f"    {line}")
+def check_evaluate_move() -> bool:
+    log_step("Testing move evaluation")
+    
+    # Test with the best move from previous analysis
+    result = analysis
+    
+    if not result.move_infos:
+        log_error("No analysis data available")
+        return False
+    
+    # Test evaluating the best move
+    best_move = result.move_infos[0].move
+    log_step(f"Evaluating move: {best_move}")
+    
+    # Find this move in the results
+    move_found = False
+    for rank, mi in enumerate(result.move_infos, 1):
+        if mi.move == best_move:
+            print(f"\n  📊 Move evaluation:")
+            print(f"    Move: {mi.move}")
+            print(f"    Rank: #{rank} of {len(result.move_infos)}")
+            print(f"    Win rate: {mi.winrate * 100:.1f}%")
+            print(f"    Score: {mi.score_lead:+.1f}")
+            print(f"    Visits: {mi.visits}")
+            move_found = True
+            break
+    
+    # Also test a potentially bad move
+    if len(result.move_infos) > 3:
+        log_step("Testing evaluation of a suboptimal move")
+        suboptimal = result.move_infos[3].move
+        wr_diff = (result.move_infos[3].winrate - result.move_infos[0].winrate) * 100
+        print(f"    Move: {suboptimal}")
+        print(f"    Win rate difference: {wr_diff:+.1f}% vs best")
+    
+    if not move_found:
+        log_error("Move not found in analysis")
+        return False
+    
+    log_success("Move evaluation completed")
+    return True
 
 # ============================================================================
-# Final Summary
+# Test 7: analyze_game (one multi-turn analyzeTurns query)
 # ============================================================================
 
-log_section("Test Summary")
-
-print("\nResults:")
-print()
+def check_analyze_game() -> bool:
+    log_step("Analyzing several turns with a single query")
+    num_moves = len(state.moves)
+    every_n = max(1, num_moves // 5)
+    turns = sorted({*range(0, num_moves + 1, every_n), num_moves})
+    print(f"    Turns: {turns}")
+    
+    results = client.analyze_positions(
+        state,
+        turns,
+        max_visits=10,
+        include_ownership=False,
+        analysis_pv_len=1,
+        top_n=1,
+    )
+    
+    if sorted(results) != turns:
+        log_error(f"Expected results for turns {turns}, got {sorted(results)}")
+        return False
+    log_success(f"One result per requested turn ({len(results)})")
+    
+    # Each response must land on its own turn: KataGo echoes turnNumber, and
+    # the side to move there is whoever plays the next move
+    for turn, result in results.items():
+        to_move = state.moves[turn][0] if turn < num_moves else state.current_player
+        if result.turn_number != turn or result.current_player != to_move:
+            log_error(
+                f"Turn {turn} got the result for turn {result.turn_number} "
+                f"({result.current_player} to move, expected {to_move})"
+            )
+            return False
+    log_success("Results mapped to the right turns")
+    
+    log_step("Running the analyze_game tool")
+    import server
+    # The server has no hook for injecting a client, so point its private
+    # singleton at the already running engine instead of booting a second
+    # one. The server's health check may restart this client while the tool
+    # runs; the test registers its own atexit stop, and the original value is
+    # restored afterwards so nothing else keeps using the test's engine
+    previous_client = server._katago_client
+    server._katago_client = client
+    try:
+        # Depending on the FastMCP version, @mcp.tool() returns the function
+        # itself or a tool object wrapping it
+        analyze_game = getattr(server.analyze_game, "fn", server.analyze_game)
+        review = analyze_game(every_n_moves=every_n, max_visits=10)
+    finally:
+        server._katago_client = previous_client
+    log_data("Game Review", review, max_lines=15)
+    
+    if f"Analyzed {len(turns)} positions" not in review:
+        log_error("analyze_game did not report every analyzed position")
+        return False
+    
+    log_success("Game analysis completed")
+    return True
 
-total_tests = len(test_results)
-passed = sum(1 for r in test_results.values() if r == 'PASS')
-failed = sum(1 for r in test_results.values() if r == 'FAIL')
-skipped = sum(1 for r in test_results.values() if r == 'SKIP')
 
-for tool, result in test_results.items():
-    icon = {'PASS': '✓', 'FAIL': '✗', 'SKIP': '⊝'}[result]
-    color = {'PASS': '', 'FAIL': '', 'SKIP': ''}[result]
-    print(f"  {icon} {tool:30s} {result}")
+# Tests in run order: (name, test, name of the test it depends on)
+TESTS = [
+    ("list_sgf_files", check_list_sgf_files, None),
+    ("get_board_state", check_get_board_state, None),
+    ("analyze_position", check_analyze_position, None),
+    ("get_move_recommendation", check_get_move_recommendation, "analyze_position"),
+    ("get_territory_analysis", check_get_territory_analysis, "analyze_position"),
+    ("evaluate_move", check_evaluate_move, "analyze_position"),
+    ("analyze_game", check_analyze_game, "analyze_position"),
+]
 
-print()
-print(f"Summary: {passed}/{total_tests} passed, {failed} failed, {skipped} skipped")
-print()
 
-if failed > 0:
-    print("⚠ Some tests failed. Common issues:")
-    print("  - Broken pipe: Check KATAGO_PATH, KATAGO_MODEL, KATAGO_CONFIG")
-    print("  - Timeout: Increase timeout or reduce maxVisits")
-    print("  - No response: Check that analysis.cfg is for analysis mode, not GTP mode")
+def main() -> int:
+    """Run every test in order, print the summary and return the exit code."""
+    print("=" * 70)
+    print(f" KataGo MCP Server - Comprehensive Tool Testing")
+    print(f" Test started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 70)
+    
+    start_client_in_background()
+    
+    for number, (name, test, requires) in enumerate(TESTS, 1):
+        run_test(number, name, test, requires)
+    
+    if client is not None:
+        log_step("Stopping KataGo client")
+        client.stop()
+        log_success("Client stopped")
+    
+    # ========================================================================
+    # Final Summary
+    # ========================================================================
+    
+    log_section("Test Summary")
+    
+    print("\nResults:")
+    print()
+    
+    total_tests = len(test_results)
+    counts = Counter(test_results.values())
+    passed, failed, skipped = counts['PASS'], counts['FAIL'], counts['SKIP']
+    
+    for tool, result in test_results.items():
+        icon = {'PASS': '✓', 'FAIL': '✗', 'SKIP': '⊝'}[result]
+        print(f"  {icon} {tool:30s} {result}")
+    
+    print()
+    print(f"Summary: {passed}/{total_tests} passed, {failed} failed, {skipped} skipped")
     print()
-    print("Run debug_katago.py for detailed KataGo communication debugging")
-    sys.exit(1)
-elif skipped > 0:
-    print("⊝ Some tests were skipped (KataGo not available)")
-    print("  Install KataGo to run full tests")
-    sys.exit(0)
-else:
-    print("✓ All tests passed successfully!")
-    sys.exit(0)
\ No newline at end of file
+    
+    if failed > 0:
+        print("⚠ Some tests failed. Common issues:")
+        print("  - Broken pipe: Check KATAGO_PATH, KATAGO_MODEL, KATAGO_CONFIG")
+        print("  - Timeout: Increase timeout or reduce maxVisits")
+        print("  - No response: Check that analysis.cfg is for analysis mode, not GTP mode")
+        print()
+        print("Run debug_katago.py for detailed KataGo communication debugging")
+        return 1
+    elif skipped > 0:
+        print("⊝ Some tests were skipped (KataGo not available)")
+        print("  Install KataGo to run full tests")
+        return 0
+    else:
+        print("✓ All tests passed successfully!")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
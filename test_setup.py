@@ -7,11 +7,12 @@ Run this to check if all components are properly configured.
 import os
 import sys
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 
-def check_dependencies():
+def check_dependencies(lines: list) -> bool:
     """Check if all required packages are installed."""
-    print("=== Checking Dependencies ===")
+    lines.append("=== Checking Dependencies ===")
     
     packages = [
         ("fastmcp", "FastMCP"),
@@ -22,17 +23,17 @@ def check_dependencies():
     for package, display_name in packages:
         try:
             __import__(package)
-            print(f"  ✓ {display_name} installed")
+            lines.append(f"  ✓ {display_name} installed")
         except ImportError:
-            print(f"  ✗ {display_name} NOT installed - run: pip install {package}")
+            lines.append(f"  ✗ {display_name} NOT installed - run: pip install {package}")
             all_ok = False
     
     return all_ok
 
 
-def check_config():
+def check_config(lines: list) -> bool:
     """Check configuration settings."""
-    print("\n=== Checking Configuration ===")
+    lines.append("\n=== Checking Configuration ===")
     
     from config import (
         KATAGO_PATH,
@@ -45,85 +46,85 @@ def check_config():
     
     # Check KataGo executable
     if os.path.isfile(KATAGO_PATH):
-        print(f"  ✓ KataGo found at: {KATAGO_PATH}")
+        lines.append(f"  ✓ KataGo found at: {KATAGO_PATH}")
     else:
-        print(f"  ✗ KataGo NOT found at: {KATAGO_PATH}")
-        print(f"    Set KATAGO_PATH environment variable to the correct path")
+        lines.append(f"  ✗ KataGo NOT found at: {KATAGO_PATH}")
+        lines.append(f"    Set KATAGO_PATH environment variable to the correct path")
         all_ok = False
     
     # Check model file
     if os.path.isfile(KATAGO_MODEL):
-        print(f"  ✓ Model found at: {KATAGO_MODEL}")
+        lines.append(f"  ✓ Model found at: {KATAGO_MODEL}")
     else:
-        print(f"  ✗ Model NOT found at: {KATAGO_MODEL}")
-        print(f"    Set KATAGO_MODEL environment variable to your model path")
+        lines.append(f"  ✗ Model NOT found at: {KATAGO_MODEL}")
+        lines.append(f"    Set KATAGO_MODEL environment variable to your model path")
         all_ok = False
     
     # Check config file
     if os.path.isfile(KATAGO_CONFIG):
-        print(f"  ✓ Config found at: {KATAGO_CONFIG}")
+        lines.append(f"  ✓ Config found at: {KATAGO_CONFIG}")
     else:
-        print(f"  ⚠ Config NOT found at: {KATAGO_CONFIG}")
-        print(f"    Using default analysis config. Set KATAGO_CONFIG if needed.")
+        lines.append(f"  ⚠ Config NOT found at: {KATAGO_CONFIG}")
+        lines.append(f"    Using default analysis config. Set KATAGO_CONFIG if needed.")
     
     # Check SGF directory
     if os.path.isdir(SGF_WATCH_PATH):
-        print(f"  ✓ SGF directory exists: {SGF_WATCH_PATH}")
+        lines.append(f"  ✓ SGF directory exists: {SGF_WATCH_PATH}")
     else:
-        print(f"  ✗ SGF directory NOT found: {SGF_WATCH_PATH}")
-        print(f"    Create the directory or set SGF_WATCH_PATH environment variable")
+        lines.append(f"  ✗ SGF directory NOT found: {SGF_WATCH_PATH}")
+        lines.append(f"    Create the directory or set SGF_WATCH_PATH environment variable")
         all_ok = False
     
     return all_ok
 
 
-def check_sgf_files():
+def check_sgf_files(lines: list) -> bool:
     """Check for SGF files in the watch directory."""
-    print("\n=== Checking SGF Files ===")
+    lines.append("\n=== Checking SGF Files ===")
     
     from config import SGF_WATCH_PATH
-    from sgf_reader import find_latest_sgf, read_sgf_file, get_game_info
+    from sgf_reader import find_latest_sgf, read_sgf_file_cached, get_game_info
     
     if not os.path.isdir(SGF_WATCH_PATH):
-        print(f"  SGF directory does not exist")
+        lines.append(f"  SGF directory does not exist")
         return False
     
     sgf_path = find_latest_sgf(SGF_WATCH_PATH)
     
     if sgf_path is None:
-        print(f"  ⚠ No SGF files found in {SGF_WATCH_PATH}")
-        print(f"    Save a game from Sabaki to this directory to test")
+        lines.append(f"  ⚠ No SGF files found in {SGF_WATCH_PATH}")
+        lines.append(f"    Save a game from Sabaki to this directory to test")
         return True  # Not a fatal error
     
-    print(f"  ✓ Found SGF file: {sgf_path}")
+    lines.append(f"  ✓ Found SGF file: {sgf_path}")
     
     try:
-        state = read_sgf_file(sgf_path)
+        state = read_sgf_file_cached(sgf_path)
         info = get_game_info(state)
-        print(f"    Board size: {info['board_size']}x{info['board_size']}")
-        print(f"    Moves: {info['move_count']}")
-        print(f"    Players: {info['black_player']} vs {info['white_player']}")
+        lines.append(f"    Board size: {info['board_size']}x{info['board_size']}")
+        lines.append(f"    Moves: {info['move_count']}")
+        lines.append(f"    Players: {info['black_player']} vs {info['white_player']}")
         return True
     except Exception as e:
-        print(f"  ✗ Error reading SGF: {e}")
+        lines.append(f"  ✗ Error reading SGF: {e}")
         return False
 
 
-def check_katago():
+def check_katago(lines: list) -> bool:
     """Check if KataGo can start."""
-    print("\n=== Checking KataGo ===")
+    lines.append("\n=== Checking KataGo ===")
     
     from config import KATAGO_PATH, KATAGO_MODEL, KATAGO_CONFIG
     
     if not os.path.isfile(KATAGO_PATH):
-        print("  ⚠ Skipping KataGo test - executable not found")
+        lines.append("  ⚠ Skipping KataGo test - executable not found")
         return True
     
     if not os.path.isfile(KATAGO_MODEL):
-        print("  ⚠ Skipping KataGo test - model not found")
+        lines.append("  ⚠ Skipping KataGo test - model not found")
         return True
     
-    print("  Testing KataGo startup...")
+    lines.append("  Testing KataGo startup...")
     
     try:
         # Test version command
@@ -136,47 +137,64 @@ def check_katago():
         
         if result.returncode == 0:
             version = result.stdout.strip().split('\n')[0]
-            print(f"  ✓ KataGo version: {version}")
+            lines.append(f"  ✓ KataGo version: {version}")
             return True
         else:
-            print(f"  ✗ KataGo failed: {result.stderr}")
+            lines.append(f"  ✗ KataGo failed: {result.stderr}")
             return False
             
     except subprocess.TimeoutExpired:
-        print("  ✗ KataGo timed out")
+        lines.append("  ✗ KataGo timed out")
         return False
     except Exception as e:
-        print(f"  ✗ Error testing KataGo: {e}")
+        lines.append(f"  ✗ Error testing KataGo: {e}")
         return False
 
 
-def check_server_import():
+def check_server_import(lines: list) -> bool:
     """Check if the server can be imported."""
-    print("\n=== Checking Server Module ===")
+    lines.append("\n=== Checking Server Module ===")
     
     try:
         from server import mcp
-        print("  ✓ Server module imported successfully")
-        print(f"    Server name: {mcp.name}")
+        lines.append("  ✓ Server module imported successfully")
+        lines.append(f"    Server name: {mcp.name}")
         return True
     except Exception as e:
-        print(f"  ✗ Error importing server: {e}")
+        lines.append(f"  ✗ Error importing server: {e}")
         return False
 
 
+def _run_check(check) -> tuple[bool, list]:
+    """Run a check, returning its result and the report lines it wrote."""
+    lines = []
+    return check(lines), lines
+
+
 def main():
     """Run all checks."""
     print("=" * 50)
     print("KataGo MCP Server - Setup Verification")
     print("=" * 50)
     
-    results = []
+    checks = [
+        ("Dependencies", check_dependencies),
+        ("Configuration", check_config),
+        ("SGF Files", check_sgf_files),
+        ("KataGo", check_katago),
+        ("Server Import", check_server_import),
+    ]
     
-    results.append(("Dependencies", check_dependencies()))
-    results.append(("Configuration", check_config()))
-    results.append(("SGF Files", check_sgf_files()))
-    results.append(("KataGo", check_katago()))
-    results.append(("Server Import", check_server_import()))
+    # The checks are independent and mostly wait on imports or a KataGo
+    # subprocess, so run them all at once. Each collects its report in its
+    # own list, printed in the original order as results come in.
+    results = []
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [(name, executor.submit(_run_check, check)) for name, check in checks]
+        for name, future in futures:
+            passed, lines = future.result()
+            print("\n".join(lines))
+            results.append((name, passed))
     
     print("\n" + "=" * 50)
     print("Summary")